@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    # Фоновые задачи (миниатюры) не должны пережить тест: иначе они пишут
+    # во временный MEDIA_ROOT, пока фикстура его удаляет.
+    yield
+    from posts import background
+    background.drain()
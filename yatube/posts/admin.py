@@ -1,18 +1,117 @@
-from django.contrib import admin
-from .models import Post, Group
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Max
+from django.utils.functional import cached_property
+from . import bulk_jobs
+from .fulltext import filter_posts
+from .models import BulkJob, Post, Group
+
+
+def estimated_count(model):
+    """Оценка числа строк таблицы без полного COUNT(*)."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return row[0]
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Считает строки не дальше POSTS_ADMIN_COUNT_LIMIT или по оценке базы."""
+
+    @cached_property
+    def count(self):
+        limit = settings.POSTS_ADMIN_COUNT_LIMIT
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model)
+            if estimate >= limit:
+                return estimate
+        return queryset.values('pk')[:limit].count()
+
+
+class PostActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(), required=False, label='Группа')
 
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    autocomplete_fields = ('author', 'group')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
+    action_form = PostActionForm
+    actions = ('delete_in_background', 'move_in_background')
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def queue(self, request, action, queryset, group=None):
+        job = bulk_jobs.queue(action, queryset, request.user, group)
+        self.message_user(
+            request, f'{job} поставлено в очередь: {job.total} постов')
+
+    def delete_in_background(self, request, queryset):
+        self.queue(request, BulkJob.DELETE, queryset)
+    delete_in_background.short_description = 'Удалить в фоне'
+
+    def move_in_background(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        group = form.cleaned_data.get('group') if form.is_valid() else None
+        if group is None:
+            self.message_user(
+                request, 'Выберите группу для переноса', messages.ERROR)
+            return
+        self.queue(request, BulkJob.MOVE, queryset, group)
+    move_in_background.short_description = 'Перенести в группу в фоне'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return filter_posts(queryset, search_term), False
+
+    def get_changelist_formset(self, request, **kwargs):
+        formset = super().get_changelist_formset(request, **kwargs)
+        field = formset.form.base_fields['group']
+        choices = list(field.choices)
+        field.widget = forms.Select()
+        field.choices = choices
+        return formset
 
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('title',)
+    search_fields = ('title', 'slug')
+
+
+class BulkJobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'action', 'group', 'status', 'processed', 'total',
+                    'progress', 'created_by', 'created')
+    list_filter = ('status', 'action')
+    readonly_fields = ('processed', 'total', 'last_post_id', 'heartbeat',
+                       'error')
+
+    def has_add_permission(self, request):
+        return False
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
+admin.site.register(BulkJob, BulkJobAdmin)
@@ -0,0 +1,50 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POSTS_BACKGROUND_WORKERS,
+            thread_name_prefix='posts-background',
+        )
+    return _executor
+
+
+def call(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Background task %s failed', func.__name__)
+
+
+def run(func, *args):
+    close_old_connections()
+    try:
+        call(func, *args)
+    finally:
+        close_old_connections()
+
+
+def submit(func, *args):
+    """Выполняет func в пуле потоков после коммита транзакции."""
+    if not settings.POSTS_BACKGROUND_WORKERS:
+        call(func, *args)
+        return
+    transaction.on_commit(lambda: executor().submit(run, func, *args))
+
+
+def drain():
+    """Дожидается выполнения уже поставленных задач и закрывает пул."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
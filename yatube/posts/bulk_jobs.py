@@ -0,0 +1,100 @@
+import bisect
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import background, feed_counts, fulltext, leaderboards, page_cache
+from .models import BulkJob, Group, Post
+
+logger = logging.getLogger(__name__)
+
+
+def queue(action, queryset, user=None, group=None):
+    """Ставит в очередь действие над постами queryset."""
+    post_ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+    job = BulkJob.objects.create(
+        action=action, group=group, post_ids=json.dumps(post_ids),
+        total=len(post_ids), created_by=user)
+    if settings.POSTS_BACKGROUND_WORKERS:
+        background.submit(run, job.pk)
+    return job
+
+
+def delete_posts(job, post_ids):
+    Post.objects.filter(pk__in=post_ids).delete()
+
+
+def move_posts(job, post_ids):
+    # Группа могла быть удалена, пока задание ждало в очереди или шло:
+    # без нее пачка не переносится, а задание завершается ошибкой.
+    group = Group.objects.filter(pk=job.group_id).first()
+    if group is None:
+        raise ValueError('Группа для переноса удалена')
+    posts = Post.objects.filter(pk__in=post_ids)
+    groups = dict(posts.exclude(group=None).values_list(
+        'group_id', 'group__slug'))
+    groups[group.pk] = group.slug
+    posts.update(group=group)
+    fulltext.reindex(posts)
+    cache.delete_many(
+        [feed_counts.group_key(slug) for slug in groups.values()]
+        + [leaderboards.group_board(pk).key for pk in groups])
+    page_cache.invalidate(page_cache.GLOBAL_SCOPE)
+
+
+ACTIONS = {
+    BulkJob.DELETE: delete_posts,
+    BulkJob.MOVE: move_posts,
+}
+
+
+def claim(job_id):
+    """Забирает задание в работу, в том числе брошенное упавшим процессом."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.POSTS_BULK_JOB_LEASE)
+    return BulkJob.objects.filter(
+        Q(status=BulkJob.PENDING)
+        | Q(status=BulkJob.RUNNING, heartbeat__lt=stale),
+        pk=job_id,
+    ).update(status=BulkJob.RUNNING, heartbeat=now) == 1
+
+
+def unfinished():
+    return list(BulkJob.objects.filter(
+        status__in=[BulkJob.PENDING, BulkJob.RUNNING]
+    ).order_by('pk').values_list('pk', flat=True))
+
+
+def run(job_id):
+    """Выполняет задание пачками, продолжая с первой необработанной."""
+    if not claim(job_id):
+        return False
+    job = BulkJob.objects.select_related('group').get(pk=job_id)
+    post_ids = json.loads(job.post_ids)
+    chunk_size = settings.POSTS_BULK_JOB_CHUNK
+    start = bisect.bisect_right(post_ids, job.last_post_id)
+    try:
+        for position in range(start, len(post_ids), chunk_size):
+            chunk = post_ids[position:position + chunk_size]
+            with transaction.atomic():
+                ACTIONS[job.action](job, chunk)
+                BulkJob.objects.filter(pk=job.pk).update(
+                    last_post_id=chunk[-1],
+                    processed=position + len(chunk),
+                    heartbeat=timezone.now(),
+                )
+    except Exception:
+        logger.exception('Bulk job %s failed', job.pk)
+        BulkJob.objects.filter(pk=job.pk).update(
+            status=BulkJob.FAILED, error=traceback.format_exc())
+        return True
+    BulkJob.objects.filter(pk=job.pk).update(
+        status=BulkJob.DONE, processed=job.total)
+    return True
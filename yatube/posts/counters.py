@@ -0,0 +1,54 @@
+from django.db import models
+from django.db.models import F, Func, OuterRef, Subquery
+from users.models import Profile
+
+from .models import Comment, Follow, Post
+
+
+def count_of(queryset):
+    """Коррелированный подзапрос с числом строк queryset."""
+    return Subquery(
+        queryset.annotate(
+            total=Func(F('pk'), function='COUNT')).values('total'),
+        output_field=models.IntegerField(),
+    )
+
+
+def actual_comment_count():
+    return count_of(Comment.objects.filter(post=OuterRef('pk')))
+
+
+def actual_followers_count():
+    return count_of(Follow.objects.filter(author=OuterRef('user_id')))
+
+
+def actual_following_count():
+    return count_of(Follow.objects.filter(user=OuterRef('user_id')))
+
+
+def bump_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta)
+
+
+def bump_profile(user_id, **deltas):
+    Profile.objects.filter(user_id=user_id).update(**{
+        field: F(field) + delta for field, delta in deltas.items()})
+
+
+def bump_follow(follow, delta):
+    bump_profile(follow.author_id, followers_count=delta)
+    bump_profile(follow.user_id, following_count=delta)
+
+
+def create_profiles(users):
+    """Создает недостающие профили сразу с точными счетчиками."""
+    user_ids = list(users.filter(profile=None).values_list('pk', flat=True))
+    Profile.objects.bulk_create(
+        [Profile(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True)
+    Profile.objects.filter(user_id__in=user_ids).update(
+        followers_count=actual_followers_count(),
+        following_count=actual_following_count(),
+    )
+    return len(user_ids)
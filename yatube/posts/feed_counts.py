@@ -0,0 +1,53 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import QuerySet
+
+
+def index_key():
+    return 'feed_count:index'
+
+
+def group_key(slug):
+    return f'feed_count:group:{slug}'
+
+
+def author_key(author_id):
+    return f'feed_count:author:{author_id}'
+
+
+def follow_key(user_id):
+    return f'feed_count:follow:{user_id}'
+
+
+def estimate_count(queryset):
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def get_count(key, queryset):
+    count = cache.get(key)
+    if count is None:
+        if (settings.POSTS_COUNT_ESTIMATE and isinstance(queryset, QuerySet)
+                and connections[queryset.db].vendor == 'postgresql'):
+            count = estimate_count(queryset)
+        else:
+            count = queryset.count()
+        cache.set(key, count, settings.POSTS_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def bump(keys, delta):
+    for key in keys:
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass
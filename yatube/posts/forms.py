@@ -1,7 +1,41 @@
+import tempfile
+
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
 from .models import Post, Comment
 from django.utils.translation import gettext_lazy as _
 
+REENCODE_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+def normalize_image(upload):
+    """Уменьшает картинку до POSTS_IMAGE_MAX_SIDE и удаляет EXIF."""
+    side = settings.POSTS_IMAGE_MAX_SIDE
+    with Image.open(upload) as image:
+        image_format = image.format
+        if image_format not in REENCODE_FORMATS or (
+                max(image.size) <= side and 'exif' not in image.info):
+            upload.seek(0)
+            return upload
+        if image_format == 'JPEG':
+            image.draft(image.mode, (side, side))
+        with ImageOps.exif_transpose(image) as resized:
+            resized.thumbnail((side, side))
+            output = tempfile.SpooledTemporaryFile(
+                max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+            try:
+                resized.save(output, format=image_format, exif=b'',
+                             quality=90)
+            except Exception:
+                output.close()
+                raise
+    upload.close()
+    size = output.tell()
+    output.seek(0)
+    return UploadedFile(output, upload.name, Image.MIME[image_format], size)
+
 
 class PostForm(forms.ModelForm):
     class Meta:
@@ -16,6 +50,26 @@ class PostForm(forms.ModelForm):
             'group': _('Группа, к которой будет '
                        'относиться пост.')}
 
+    def __init__(self, *args, rejected=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.image_too_large = 'image' in rejected
+
+    def clean_image(self):
+        if self.image_too_large:
+            raise forms.ValidationError(
+                _('Файл больше %(limit)s МБ.'), code='too_large',
+                params={'limit': settings.POSTS_IMAGE_MAX_BYTES // 2 ** 20})
+        image = self.cleaned_data['image']
+        if not hasattr(image, 'image'):
+            return image
+        width, height = image.image.size
+        if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                _('Картинка больше %(limit)s мегапикселей.'),
+                code='too_many_pixels',
+                params={'limit': settings.POSTS_IMAGE_MAX_PIXELS // 10 ** 6})
+        return normalize_image(image)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,165 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Post
+
+TABLE = 'posts_post_search'
+BATCH_SIZE = 1000
+TOKEN = re.compile(r'\w+')
+
+SQLITE_UPSERT = (
+    f'INSERT OR REPLACE INTO {TABLE} '
+    '(rowid, text, group_title, author_name) VALUES (%s, %s, %s, %s)'
+)
+SQLITE_SEARCH = (
+    f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+    f'ORDER BY bm25({TABLE}, 1.0, 0.5, 0.5), rowid DESC LIMIT %s OFFSET %s'
+)
+SQLITE_COUNT = f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s'
+
+POSTGRES_UPSERT = (
+    f'INSERT INTO {TABLE} (post_id, document) VALUES (%s, '
+    "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+    "setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+    "setweight(to_tsvector(%s::regconfig, %s), 'B')) "
+    'ON CONFLICT (post_id) DO UPDATE SET document = excluded.document'
+)
+POSTGRES_SEARCH = (
+    f'SELECT post_id FROM {TABLE}, '
+    'plainto_tsquery(%s::regconfig, %s) query WHERE document @@ query '
+    'ORDER BY ts_rank(document, query) DESC, post_id DESC LIMIT %s OFFSET %s'
+)
+POSTGRES_COUNT = (
+    f'SELECT count(*) FROM {TABLE} '
+    'WHERE document @@ plainto_tsquery(%s::regconfig, %s)'
+)
+
+
+def indexed():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def author_name(author):
+    return ' '.join(
+        filter(None, [author.username, author.first_name, author.last_name]))
+
+
+def document(post):
+    group_title = post.group.title if post.group_id else ''
+    return post.text, group_title, author_name(post.author)
+
+
+def index_posts(posts):
+    """Добавляет посты в индекс или обновляет их документы."""
+    if not indexed():
+        return
+    config = settings.POSTS_SEARCH_CONFIG
+    rows = []
+    for post in posts:
+        text, group_title, name = document(post)
+        if connection.vendor == 'sqlite':
+            rows.append([post.pk, text, group_title, name])
+        else:
+            rows.append([post.pk, config, text, config, group_title,
+                         config, name])
+    sql = SQLITE_UPSERT if connection.vendor == 'sqlite' else POSTGRES_UPSERT
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            cursor.executemany(sql, rows[start:start + BATCH_SIZE])
+
+
+def reindex(queryset):
+    """Переиндексирует посты queryset пачками."""
+    queryset = queryset.select_related('author', 'group').order_by('pk')
+    last_pk = 0
+    while True:
+        posts = list(queryset.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not posts:
+            return
+        index_posts(posts)
+        last_pk = posts[-1].pk
+
+
+def remove(post_id):
+    if not indexed():
+        return
+    column = 'rowid' if connection.vendor == 'sqlite' else 'post_id'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE {column} = %s', [post_id])
+
+
+def filter_posts(queryset, query):
+    """Ограничивает queryset постами, найденными в индексе."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if connection.vendor == 'sqlite':
+        where = (f'posts_post.id IN (SELECT rowid FROM {TABLE} '
+                 f'WHERE {TABLE} MATCH %s)')
+        params = [expression]
+    elif connection.vendor == 'postgresql':
+        where = (f'posts_post.id IN (SELECT post_id FROM {TABLE} WHERE '
+                 'document @@ plainto_tsquery(%s::regconfig, %s))')
+        params = [settings.POSTS_SEARCH_CONFIG, query]
+    else:
+        return queryset.filter(text__icontains=query)
+    return queryset.extra(where=[where], params=params)
+
+
+def match_expression(query):
+    """Запрос FTS5 из слов пользователя: все слова, последнее — префиксом."""
+    tokens = TOKEN.findall(query.lower())
+    if not tokens:
+        return ''
+    words = [f'"{token}"' for token in tokens]
+    words[-1] += '*'
+    return ' '.join(words)
+
+
+class SearchResults:
+    """Найденные посты по релевантности, загружаемые постранично."""
+
+    def __init__(self, query):
+        self.query = query.strip()
+        self.expression = match_expression(self.query)
+
+    def search(self, limit, offset):
+        if connection.vendor == 'sqlite':
+            sql, params = SQLITE_SEARCH, [self.expression, limit, offset]
+        else:
+            sql = POSTGRES_SEARCH
+            params = [settings.POSTS_SEARCH_CONFIG, self.query, limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [post_id for post_id, in cursor.fetchall()]
+
+    def fallback(self):
+        return Post.objects.for_feed().filter(text__icontains=self.query)
+
+    def count(self):
+        if not self.expression:
+            return 0
+        if not indexed():
+            return self.fallback().count()
+        if connection.vendor == 'sqlite':
+            sql, params = SQLITE_COUNT, [self.expression]
+        else:
+            sql = POSTGRES_COUNT
+            params = [settings.POSTS_SEARCH_CONFIG, self.query]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, page):
+        if not self.expression:
+            return []
+        if not indexed():
+            return list(self.fallback()[page])
+        post_ids = self.search(page.stop - page.start, page.start)
+        found = Post.objects.for_feed().in_bulk(post_ids)
+        return [found[post_id] for post_id in post_ids if post_id in found]
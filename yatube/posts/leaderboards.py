@@ -0,0 +1,145 @@
+import bisect
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Post
+
+GROUP_KEY = 'leaderboard:group:{}'
+PERIOD_KEY = 'leaderboard:{}:{:%Y-%m-%d}'
+LOCK_KEY = 'leaderboard:lock'
+LOCK_TIMEOUT = 10
+WEEK = 'week'
+MONTH = 'month'
+
+
+def capacity():
+    # Запас сверх показываемых постов: пост, потерявший голоса, не
+    # вытесняет сразу того, кто был за границей топа.
+    return settings.POSTS_LEADERBOARD_SIZE * 2
+
+
+def period_start(period, date):
+    date = timezone.localtime(date).date()
+    if period == WEEK:
+        return date - timedelta(days=date.weekday())
+    return date.replace(day=1)
+
+
+def period_end(period, start):
+    if period == WEEK:
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+class Board:
+    """Топ-K постов в кеше: список (-оценка, -id) по возрастанию."""
+
+    def __init__(self, key, queryset, field):
+        self.key = key
+        self.queryset = queryset
+        self.field = field
+
+    def rebuild(self):
+        rows = self.queryset.order_by(f'-{self.field}', '-id').values_list(
+            self.field, 'pk')[:capacity()]
+        entries = [(-score, -pk) for score, pk in rows]
+        cache.set(self.key, entries, settings.POSTS_LEADERBOARD_TIMEOUT)
+        return entries
+
+    def posts(self):
+        entries = cache.get(self.key)
+        if entries is None:
+            entries = self.rebuild()
+        post_ids = [-pk for _, pk in entries[:settings.POSTS_LEADERBOARD_SIZE]]
+        found = self.queryset.for_feed().in_bulk(post_ids)
+        return [found[pk] for pk in post_ids if pk in found]
+
+
+def group_board(group_id):
+    return Board(GROUP_KEY.format(group_id),
+                 Post.objects.filter(group_id=group_id), 'hot_score')
+
+
+def local_midnight(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def period_board(period, date=None):
+    start = period_start(period, date or timezone.now())
+    return Board(
+        PERIOD_KEY.format(period, start),
+        Post.objects.filter(
+            pub_date__gte=local_midnight(start),
+            pub_date__lt=local_midnight(period_end(period, start))),
+        'raiting')
+
+
+def place(entries, post_id, score):
+    entries = [entry for entry in entries if entry[1] != -post_id]
+    entry = (-score, -post_id)
+    if len(entries) >= capacity() and entry >= entries[-1]:
+        return entries
+    bisect.insort(entries, entry)
+    return entries[:capacity()]
+
+
+def post_scores(post):
+    scores = {
+        period_board(WEEK, post.pub_date).key: post.raiting,
+        period_board(MONTH, post.pub_date).key: post.raiting,
+    }
+    if post.group_id:
+        scores[group_board(post.group_id).key] = post.hot_score
+    return scores
+
+
+def edit(changes):
+    """Правит топы в кеше под блокировкой, а без нее сбрасывает их."""
+    if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        cache.delete_many(list(changes))
+        return
+    try:
+        boards = cache.get_many(list(changes))
+        for key, entries in boards.items():
+            boards[key] = changes[key](entries)
+        cache.set_many(boards, settings.POSTS_LEADERBOARD_TIMEOUT)
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def placing(items):
+    def apply(entries):
+        for post_id, score in items:
+            entries = place(entries, post_id, score)
+        return entries
+    return apply
+
+
+def dropping(post_id):
+    return lambda entries: [
+        entry for entry in entries if entry[1] != -post_id]
+
+
+def update(posts):
+    """Переставляет посты во всех их топах, уже лежащих в кеше."""
+    updates = {}
+    for post in posts:
+        for key, score in post_scores(post).items():
+            updates.setdefault(key, []).append((post.pk, score))
+    edit({key: placing(items) for key, items in updates.items()})
+
+
+def moved(post, group_id):
+    """Переносит пост из топа прежней группы в топ новой."""
+    changes = {group_board(group_id).key: dropping(post.pk)}
+    if post.group_id:
+        changes[group_board(post.group_id).key] = placing(
+            [(post.pk, post.hot_score)])
+    edit(changes)
+
+
+def remove(post):
+    edit({key: dropping(post.pk) for key in post_scores(post)})
@@ -0,0 +1,207 @@
+import json
+import math
+import random
+import sys
+import time
+import tracemalloc
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post
+
+from .utils import temporary_database
+
+User = get_user_model()
+
+# Какие метрики сравниваются с базовым прогоном и насколько строго:
+# число запросов детерминировано, время и память — с допуском.
+CHECKS = (
+    ('queries', False),
+    ('p95_ms', True),
+    ('memory_kib', True),
+)
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def regressions(results, baseline, tolerance):
+    """Список метрик, ухудшившихся относительно baseline."""
+    found = []
+    for name, base in baseline['views'].items():
+        current = results['views'].get(name)
+        if current is None:
+            continue
+        for metric, tolerant in CHECKS:
+            limit = base[metric] * (1 + tolerance) if tolerant else (
+                base[metric])
+            if current[metric] > limit:
+                found.append(
+                    f'{name}.{metric}: {current[metric]} > {base[metric]}')
+    return found
+
+
+class QueryTimer:
+    """Обертка execute_wrapper, считающая запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.elapsed = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.elapsed += time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ('Заполняет временную базу и замеряет задержку, запросы к базе '
+            'и память основных страниц постов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Замеряемых запросов на страницу')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--memory-requests', type=int, default=5,
+                            help='Запросов под tracemalloc на страницу')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+        parser.add_argument('--baseline',
+                            help='JSON прошлого прогона для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Допустимый рост времени и памяти')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        cache = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'benchmark_views',
+        }}
+        with override_settings(CACHES=cache), temporary_database():
+            self.stdout.write(f'= Seeding {options["posts"]} posts =')
+            call_command(
+                'seed_data', users=options['users'], posts=options['posts'],
+                seed=options['seed'], stdout=StringIO())
+            results = {
+                'dataset': {key: options[key]
+                            for key in ('users', 'posts', 'seed')},
+                'views': {
+                    name: self.measure(name, request)
+                    for name, request in self.views()
+                },
+            }
+        self.save(results)
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+            found = regressions(results, baseline, options['tolerance'])
+            if found:
+                raise CommandError(
+                    'Performance regressions:\n' + '\n'.join(found))
+            self.stdout.write(self.style.SUCCESS(
+                '=== No regressions against the baseline ==='))
+
+    def views(self):
+        readers = list(Follow.objects.order_by('user').values_list(
+            'user', flat=True).distinct())
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(User.objects.get(pk=self.random.choice(readers)))
+        post_ids = list(Post.objects.order_by('pk').values_list(
+            'pk', flat=True))
+        slugs = list(Group.objects.order_by('pk').values_list(
+            'slug', flat=True))
+        usernames = list(User.objects.filter(
+            posts__isnull=False).distinct().order_by('pk').values_list(
+            'username', flat=True))
+        voted = iter(self.random.sample(post_ids, len(post_ids)))
+
+        def pick(items):
+            return self.random.choice(items)
+
+        def page(name, choices=None):
+            return lambda: client.get(
+                reverse(name, args=[pick(choices)] if choices else None),
+                {'page': self.random.randint(1, 3)})
+
+        return [
+            ('index', page('posts:main')),
+            ('group_posts', page('posts:group_posts', slugs)),
+            ('profile', page('posts:profile', usernames)),
+            ('post_detail', lambda: client.get(
+                reverse('posts:post_detail', args=[pick(post_ids)]))),
+            ('follow_index', lambda: client.get(
+                reverse('posts:follow_index'))),
+            ('best_posts', lambda: client.get(reverse('posts:best'))),
+            ('like', lambda: client.post(
+                reverse('posts:like', args=[next(voted, pick(post_ids))]))),
+            ('dislike', lambda: client.post(
+                reverse('posts:dislike',
+                        args=[next(voted, pick(post_ids))]))),
+            ('add_comment', lambda: client.post(
+                reverse('posts:add_comment', args=[pick(post_ids)]),
+                {'text': 'Комментарий для замера'})),
+        ]
+
+    def measure(self, name, request):
+        options = self.options
+        for _ in range(options['warmup']):
+            request()
+        latencies, queries, query_times = [], [], []
+        for _ in range(options['requests']):
+            timer = QueryTimer()
+            with connection.execute_wrapper(timer):
+                started = time.perf_counter()
+                response = request()
+                latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{name} responded with {response.status_code}')
+            queries.append(timer.count)
+            query_times.append(timer.elapsed * 1000)
+        peaks = []
+        for _ in range(options['memory_requests']):
+            # Пик считается с нуля на каждый запрос: трассировка
+            # запускается заново (reset_peak есть только с Python 3.9).
+            tracemalloc.start()
+            try:
+                request()
+                peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+            finally:
+                tracemalloc.stop()
+        result = {
+            'p50_ms': round(percentile(latencies, 0.5), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'queries': max(queries),
+            'query_ms': round(sum(query_times) / len(query_times), 2),
+            'memory_kib': round(max(peaks, default=0), 1),
+        }
+        self.stdout.write(
+            f'== {name}: p50 {result["p50_ms"]} ms, '
+            f'p95 {result["p95_ms"]} ms, {result["queries"]} queries '
+            f'({result["query_ms"]} ms), {result["memory_kib"]} KiB ==')
+        return result
+
+    def save(self, results):
+        data = json.dumps(results, indent=2, ensure_ascii=False)
+        if not self.options['output']:
+            return
+        if self.options['output'] == '-':
+            sys.stdout.write(data + '\n')
+            return
+        with open(self.options['output'], 'w') as file:
+            file.write(data + '\n')
+        self.stdout.write(f'= Results saved to {self.options["output"]} =')
@@ -0,0 +1,108 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import ranking, timeline
+from posts.models import Follow, Group, Post
+
+from .utils import explicit_pub_date, temporary_database
+
+User = get_user_model()
+
+CHUNK_SIZE = 10000
+USERS = 1000
+GROUPS = 50
+FOLLOWS = 100
+PAGE_SIZE = 11
+
+
+class Command(BaseCommand):
+    help = ('Заполняет временную базу постами и показывает планы '
+            'запросов лент вместе с используемыми индексами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with temporary_database():
+            self.seed(options['posts'])
+            missing = [
+                name for name, index, queryset in self.feeds()
+                if not self.report(name, index, queryset)
+            ]
+        if missing:
+            raise CommandError(
+                f'Indexes are not used by: {", ".join(missing)}')
+        self.stdout.write(self.style.SUCCESS(
+            '=== All feeds use their indexes ==='))
+
+    def seed(self, count):
+        self.stdout.write(f'= Seeding {count} posts =')
+        User.objects.bulk_create(
+            User(username=f'user{n}') for n in range(USERS))
+        Group.objects.bulk_create(
+            Group(title=f'group{n}', slug=f'group{n}', description='-')
+            for n in range(GROUPS))
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        group_ids = list(Group.objects.values_list('pk', flat=True))
+        self.reader = user_ids[0]
+        Follow.objects.bulk_create(
+            Follow(user_id=self.reader, author_id=author_id)
+            for author_id in random.sample(user_ids[1:], FOLLOWS))
+        now = timezone.now()
+
+        def post(n):
+            raiting = random.randint(-50, 50)
+            pub_date = now - timedelta(seconds=n)
+            return Post(
+                text='-',
+                author_id=random.choice(user_ids),
+                group_id=random.choice(group_ids + [None]),
+                raiting=raiting,
+                pub_date=pub_date,
+                hot_score=ranking.hot_score(raiting, pub_date),
+            )
+
+        with explicit_pub_date():
+            for start in range(0, count, CHUNK_SIZE):
+                Post.objects.bulk_create([
+                    post(n)
+                    for n in range(start, min(start + CHUNK_SIZE, count))
+                ])
+        for author_id in Follow.objects.values_list('author', flat=True):
+            timeline.backfill(self.reader, author_id)
+        self.group = group_ids[0]
+        self.author = user_ids[1]
+
+    def feeds(self):
+        feed = Post.objects.for_feed()
+        by_date = ('-pub_date', '-id')
+        return [
+            ('index', 'post_pub_date_idx', feed.order_by(*by_date)),
+            ('group', 'post_group_pub_date_idx',
+             feed.filter(group_id=self.group).order_by(*by_date)),
+            ('profile', 'post_author_pub_date_idx',
+             feed.filter(author_id=self.author).order_by(*by_date)),
+            ('best', 'post_hot_score_idx',
+             feed.order_by('-hot_score', '-id')),
+            ('follow', 'timeline_user_pub_date_idx',
+             timeline.feed(self.reader)),
+        ]
+
+    def report(self, name, index, queryset):
+        queryset = queryset[:PAGE_SIZE]
+        plan = queryset.explain()
+        started = time.perf_counter()
+        list(queryset)
+        elapsed = (time.perf_counter() - started) * 1000
+        used = index in plan
+        style = self.style.SUCCESS if used else self.style.ERROR
+        self.stdout.write(style(f'== {name}: {index} {elapsed:.1f} ms =='))
+        self.stdout.write(plan)
+        return used
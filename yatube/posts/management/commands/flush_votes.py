@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+from posts import vote_buffer
+
+
+class Command(BaseCommand):
+    help = 'Записывает накопленные в буфере голоса в рейтинг постов'
+
+    def handle(self, *args, **kwargs):
+        flushed = vote_buffer.flush()
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Updated raiting of {flushed} posts ==='))
@@ -0,0 +1,170 @@
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from posts.models import Post
+from posts.thumbnail_kvstore import KVStore
+
+BATCH_SIZE = 1000
+
+
+def walk(path):
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def url_names(urls):
+    for name, value in urls.items():
+        if name == 'source':
+            continue
+        if isinstance(value, dict):
+            values = [
+                candidate.split()[0]
+                for srcset in value.values() for candidate in srcset.split(',')
+            ]
+        else:
+            values = [value]
+        for url in values:
+            if url.startswith(settings.MEDIA_URL):
+                yield url[len(settings.MEDIA_URL):]
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из media/cache миниатюры, на которые не ссылаются '
+            'посты, и их записи в хранилище миниатюр')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не трогать файлы моложе этого числа секунд')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        kvstore = KVStore()
+        self.kvstore_path = os.path.abspath(kvstore.path())
+        self.kvstore = kvstore.connection()
+        with tempfile.TemporaryDirectory() as directory:
+            self.live = sqlite3.connect(os.path.join(directory, 'live.db'))
+            self.live.execute('CREATE TABLE live (name TEXT PRIMARY KEY)')
+            try:
+                self.collect_live()
+                files, size = self.collect_files(
+                    time.time() - options['min_age'])
+                entries = self.collect_entries()
+            finally:
+                self.live.close()
+        verb = 'Would reclaim' if self.dry_run else 'Reclaimed'
+        self.stdout.write(self.style.SUCCESS(
+            f'=== {verb} {size} bytes: {files} files, '
+            f'{entries} thumbnail store entries ==='))
+
+    def add_live(self, names):
+        for batch in batches(names, self.batch_size):
+            self.live.executemany(
+                'INSERT OR IGNORE INTO live VALUES (?)',
+                [(name,) for name in batch])
+
+    def is_live(self, names):
+        found = self.live.execute(
+            'SELECT name FROM live WHERE name IN ({})'.format(
+                ', '.join('?' * len(names))), names)
+        return {name for name, in found}
+
+    def pending_thumbnails(self, image):
+        rows = self.kvstore.execute(
+            'SELECT value FROM kvstore WHERE source = ?',
+            [ImageFile(image).key])
+        return [json.loads(value)['name'] for value, in rows]
+
+    def live_names(self):
+        for post in Post.objects.exclude(image='').only(
+                'image', 'thumbnails').iterator(chunk_size=self.batch_size):
+            yield post.image.name
+            urls = post.thumbnail_urls
+            if urls:
+                yield from url_names(urls)
+            else:
+                yield from self.pending_thumbnails(post.image)
+
+    def collect_live(self):
+        self.add_live(self.live_names())
+        self.live.commit()
+
+    def collect_files(self, before):
+        root = os.path.join(
+            settings.MEDIA_ROOT, thumbnail_settings.THUMBNAIL_PREFIX)
+        if not os.path.isdir(root):
+            return 0, 0
+        files = size = 0
+        candidates = (
+            entry for entry in walk(root)
+            if not os.path.abspath(entry.path).startswith(self.kvstore_path)
+            and entry.stat().st_mtime < before
+        )
+        for batch in batches(candidates, self.batch_size):
+            names = {
+                os.path.relpath(entry.path, settings.MEDIA_ROOT).replace(
+                    os.sep, '/'): entry
+                for entry in batch
+            }
+            live = self.is_live(list(names))
+            for name, entry in names.items():
+                if name in live:
+                    continue
+                files += 1
+                size += entry.stat().st_size
+                if not self.dry_run:
+                    os.remove(entry.path)
+        return files, size
+
+    def collect_entries(self):
+        image_prefix = add_prefix('', 'image')
+        last_rowid = removed = 0
+        while True:
+            rows = self.kvstore.execute(
+                'SELECT rowid, key, value FROM kvstore '
+                'WHERE rowid > ? AND key LIKE ? ORDER BY rowid LIMIT ?',
+                [last_rowid, image_prefix + '%', self.batch_size]).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            names = {json.loads(value)['name']: key for _, key, value in rows}
+            live = self.is_live(list(names))
+            dead = [key for name, key in names.items() if name not in live]
+            removed += len(dead)
+            if dead and not self.dry_run:
+                thumbnail_lists = [
+                    add_prefix(key[len(image_prefix):], 'thumbnails')
+                    for key in dead
+                ]
+                with self.kvstore:
+                    self.kvstore.executemany(
+                        'DELETE FROM kvstore WHERE key = ?',
+                        [(key,) for key in dead + thumbnail_lists])
+        return removed
@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+from posts.thumbnail_kvstore import forget_connections
+
+
+def generate(post_id):
+    try:
+        thumbnails.generate(post_id)
+    except Exception as error:
+        return post_id, str(error)
+    return post_id, None
+
+
+class Command(BaseCommand):
+    help = ('Создает миниатюры и варианты srcset для уже загруженных '
+            'картинок постов на всех ядрах процессора')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--force', action='store_true')
+
+    def handle(self, *args, **options):
+        post_ids = [
+            post.pk for post in Post.objects.exclude(image='').only(
+                'image', 'thumbnails').iterator()
+            if options['force'] or 'srcset' not in post.thumbnail_urls
+        ]
+        self.stdout.write(f'= Generating thumbnails for {len(post_ids)} '
+                          f'posts =')
+        if options['workers'] > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(
+                    max_workers=options['workers'],
+                    mp_context=multiprocessing.get_context('fork'),
+                    initializer=forget_connections) as pool:
+                results = list(pool.map(generate, post_ids, chunksize=16))
+        else:
+            results = [generate(post_id) for post_id in post_ids]
+        failed = [(pk, error) for pk, error in results if error]
+        for post_id, error in failed:
+            self.stderr.write(f'Post {post_id}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Generated thumbnails for '
+            f'{len(results) - len(failed)} posts ==='))
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from posts import ranking
+from posts.models import Post
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BATCH_SIZE = 10000
+WRITE_SIZE = 500
+
+
+def hot_scores(raitings, seconds):
+    """Векторная версия ranking.hot_score."""
+    raitings = numpy.asarray(raitings, dtype=numpy.float64)
+    return (numpy.sign(raitings)
+            * numpy.log10(numpy.maximum(numpy.abs(raitings), 1))
+            + numpy.asarray(seconds) / settings.POSTS_HOT_SCORE_DECAY)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает оценки «лучших» постов для всей таблицы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if numpy is None:
+            raise CommandError('numpy is required: pip install numpy')
+        last_pk = updated = 0
+        while True:
+            rows = list(Post.objects.filter(pk__gt=last_pk).order_by(
+                'pk').values_list('pk', 'raiting', 'pub_date', 'hot_score')[
+                :options['batch_size']])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            pks, raitings, dates, current = zip(*rows)
+            seconds = [(date - ranking.EPOCH).total_seconds()
+                       for date in dates]
+            scores = hot_scores(raitings, seconds)
+            changed = numpy.flatnonzero(~numpy.isclose(
+                scores, current, rtol=0, atol=1e-9))
+            for start in range(0, len(changed), WRITE_SIZE):
+                ranking.write({
+                    pks[i]: float(scores[i])
+                    for i in changed[start:start + WRITE_SIZE]
+                })
+            updated += len(changed)
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Updated hot scores of {updated} posts ==='))
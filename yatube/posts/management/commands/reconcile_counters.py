@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from users.models import Profile
+
+from posts import counters
+from posts.models import Post
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счетчики комментариев и подписок с данными '
+            'и исправляет расхождения пачками')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        created = self.create_profiles()
+        posts = self.reconcile(Post.objects.all(), {
+            'comment_count': counters.actual_comment_count,
+        })
+        profiles = self.reconcile(Profile.objects.all(), {
+            'followers_count': counters.actual_followers_count,
+            'following_count': counters.actual_following_count,
+        })
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Fixed {posts} posts, {profiles} profiles, '
+            f'created {created} profiles ==='))
+
+    def create_profiles(self):
+        created = 0
+        while True:
+            batch = User.objects.filter(profile=None).order_by('pk')
+            found = counters.create_profiles(
+                User.objects.filter(pk__in=list(batch.values_list(
+                    'pk', flat=True)[:self.batch_size])))
+            if not found:
+                return created
+            created += found
+
+    def reconcile(self, queryset, fields):
+        drift = Q()
+        for field in fields:
+            drift |= ~Q(**{field: F(f'actual_{field}')})
+        fixed = last_pk = 0
+        while True:
+            pks = list(queryset.filter(pk__gt=last_pk).order_by(
+                'pk').values_list('pk', flat=True)[:self.batch_size])
+            if not pks:
+                return fixed
+            last_pk = pks[-1]
+            drifted = list(queryset.filter(pk__in=pks).annotate(**{
+                f'actual_{field}': actual() for field, actual in fields.items()
+            }).filter(drift).values_list('pk', flat=True))
+            if drifted:
+                with transaction.atomic():
+                    fixed += queryset.filter(pk__in=drifted).update(**{
+                        field: actual() for field, actual in fields.items()})
@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+
+from posts import bulk_jobs
+from posts.models import BulkJob
+
+
+class Command(BaseCommand):
+    help = ('Выполняет массовые задания админки, которые ждут в очереди '
+            'или были прерваны')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Продолжить задания, завершившиеся ошибкой')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            BulkJob.objects.filter(status=BulkJob.FAILED).update(
+                status=BulkJob.PENDING, error='')
+        for job_id in bulk_jobs.unfinished():
+            if not bulk_jobs.run(job_id):
+                self.stdout.write(f'Job {job_id} is running elsewhere')
+                continue
+            job = BulkJob.objects.get(pk=job_id)
+            self.stdout.write(
+                f'Job {job_id}: {job.status}, '
+                f'{job.processed}/{job.total} posts')
+            if job.error:
+                self.stderr.write(job.error)
+        self.stdout.write(self.style.SUCCESS('=== Bulk jobs processed ==='))
@@ -0,0 +1,336 @@
+import multiprocessing
+import os
+import random
+import time
+import uuid
+from array import array
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import BaseCommand, call_command
+from django.db import connection, connections, transaction
+from django.db.models import F, Func, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from PIL import Image
+
+from posts import fulltext, page_cache, ranking, timeline
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, Vote
+
+from .recompute_hot_scores import numpy
+
+User = get_user_model()
+
+IMAGE_DIR = 'posts/seed'
+IMAGE_SIZE = (960, 600)
+
+_faker = None
+
+
+def faker():
+    global _faker
+    if _faker is None:
+        from faker import Faker
+        _faker = Faker('ru_RU')
+    return _faker
+
+
+def zipf_index(rng, n, s):
+    """Индекс от 0 до n - 1 с вероятностью ~ 1 / (индекс + 1) ** s."""
+    u = rng.random()
+    if s == 1:
+        x = n ** u
+    else:
+        x = ((n ** (1 - s) - 1) * u + 1) ** (1 / (1 - s))
+    return min(int(x), n) - 1
+
+
+def insert(model, columns, rows, ignore_conflicts=False):
+    """Записывает строки одним executemany в обход ORM и сигналов."""
+    if not rows:
+        return
+    ops = connection.ops
+    meta = model._meta
+    fields = [meta.get_field(name) for name in columns]
+    rest = [field for field in meta.concrete_fields
+            if not field.primary_key and field not in fields]
+    defaults = tuple(
+        field.get_db_prep_save(field.get_default(), connection)
+        for field in rest)
+    dates = [n for n, field in enumerate(fields)
+             if field.get_internal_type() == 'DateTimeField']
+    if dates:
+        rows = [
+            tuple(ops.adapt_datetimefield_value(value)
+                  if n in dates else value for n, value in enumerate(row))
+            for row in rows
+        ]
+    names = ', '.join(
+        ops.quote_name(field.column) for field in fields + rest)
+    values = ', '.join(['%s'] * (len(fields) + len(rest)))
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=ignore_conflicts)} '
+        f'{ops.quote_name(meta.db_table)} ({names}) VALUES ({values}) '
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=ignore_conflicts)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [row + defaults for row in rows])
+
+
+def generate(task):
+    """Генерирует пачку строк со своим генератором случайных чисел."""
+    kind, start, count, options = task
+    rng = random.Random(f'{options["seed"]}:{kind}:{start}')
+    fake = faker()
+    fake.seed_instance(rng.random())
+    skew = options['zipf']
+    if kind == 'users':
+        return [
+            (fake.first_name(), fake.last_name()) for _ in range(count)]
+    if kind == 'images':
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, IMAGE_DIR),
+                    exist_ok=True)
+        for n in range(start, start + count):
+            color = tuple(rng.randrange(256) for _ in range(3))
+            Image.new('RGB', IMAGE_SIZE, color).save(
+                os.path.join(settings.MEDIA_ROOT, IMAGE_DIR, f'{n}.jpg'))
+        return []
+    if kind == 'posts':
+        groups = options['groups']
+        return [
+            (
+                zipf_index(rng, options['users'], skew),
+                (zipf_index(rng, groups, skew)
+                 if groups and rng.random() < 0.8 else None),
+                fake.paragraph(nb_sentences=rng.randint(1, 8)),
+                rng.uniform(0, options['days'] * 24 * 60 * 60),
+            )
+            for _ in range(count)
+        ]
+    if kind == 'comments':
+        return [
+            (zipf_index(rng, options['posts'], skew),
+             rng.randrange(options['users']),
+             fake.sentence(nb_words=rng.randint(3, 20)),
+             rng.random())
+            for _ in range(count)
+        ]
+    if kind == 'follows':
+        return [
+            (rng.randrange(options['users']),
+             zipf_index(rng, options['users'], skew))
+            for _ in range(count)
+        ]
+    return [
+        (rng.randrange(options['users']),
+         zipf_index(rng, options['posts'], skew),
+         Vote.LIKE if rng.random() < 0.7 else Vote.DISLIKE)
+        for _ in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу пользователями, группами, постами, '
+            'комментариями, подписками и голосами для нагрузочных тестов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=None,
+                            help='По умолчанию вдвое больше постов')
+        parser.add_argument('--follows', type=int, default=None,
+                            help='По умолчанию 20 на пользователя')
+        parser.add_argument('--votes', type=int, default=None,
+                            help='По умолчанию втрое больше постов')
+        parser.add_argument('--images', type=int, default=0,
+                            help='Сколько постов получат картинки')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить посты')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Показатель степенного распределения')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--skip-derived', action='store_true',
+                            help='Не пересчитывать счетчики, оценки, '
+                                 'поисковый индекс и ленты')
+
+    def handle(self, *args, **options):
+        for name, per in (('comments', 2), ('votes', 3)):
+            if options[name] is None:
+                options[name] = options['posts'] * per
+        if options['follows'] is None:
+            options['follows'] = options['users'] * 20
+        self.options = options
+        self.prefix = f'seed{options["seed"]}_{uuid.uuid4().hex[:8]}_'
+        self.now = timezone.now()
+        self.user_ids, self.post_ids = array('q'), array('q')
+        self.group_ids = []
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(max(options['workers'], 1)) as self.pool:
+            self.images()
+            self.users()
+            self.groups()
+            self.posts()
+            self.relations()
+        if not options['skip_derived']:
+            self.derive()
+        self.stdout.write(self.style.SUCCESS('=== Seeding finished ==='))
+
+    def tasks(self, kind, total):
+        size = self.options['chunk_size']
+        shared = {
+            key: self.options[key] for key in ('seed', 'zipf', 'days')}
+        shared.update(users=len(self.user_ids),
+                      groups=len(self.group_ids),
+                      posts=len(self.post_ids))
+        return [
+            (kind, start, min(size, total - start), shared)
+            for start in range(0, total, size)
+        ]
+
+    def load(self, kind, total, build, model, columns, **kwargs):
+        started = time.perf_counter()
+        for rows in self.pool.imap(generate, self.tasks(kind, total)):
+            with transaction.atomic():
+                insert(model, columns,
+                       [row for row in map(build, rows) if row is not None],
+                       **kwargs)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'== {kind}: {total} in {elapsed:.1f} s ==')
+
+    def images(self):
+        if not self.options['images']:
+            return
+        started = time.perf_counter()
+        list(self.pool.imap_unordered(
+            generate, self.tasks('images', self.options['images'])))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'== images: {self.options["images"]} in {elapsed:.1f} s ==')
+
+    def users(self):
+        names = iter(range(self.options['users']))
+        self.load(
+            'users', self.options['users'],
+            lambda row: (f'{self.prefix}{next(names)}', '!', *row),
+            User, ('username', 'password', 'first_name', 'last_name'))
+        self.user_ids = array('q', User.objects.filter(
+            username__startswith=self.prefix).order_by(
+            'pk').values_list('pk', flat=True))
+
+    def groups(self):
+        Group.objects.bulk_create(
+            Group(title=f'Группа {n}', slug=f'{self.prefix}{n}',
+                  description='-')
+            for n in range(self.options['groups']))
+        self.group_ids = list(Group.objects.filter(
+            slug__startswith=self.prefix).order_by(
+            'pk').values_list('pk', flat=True))
+
+    def posts(self):
+        last_pk = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        numbers = iter(range(self.options['posts']))
+        self.post_ages = array('d')
+
+        def build(row):
+            author, group, text, seconds = row
+            number = next(numbers)
+            self.post_ages.append(seconds)
+            pub_date = self.now - timedelta(seconds=seconds)
+            return (
+                self.user_ids[author],
+                None if group is None else self.group_ids[group],
+                text,
+                pub_date,
+                ranking.hot_score(0, pub_date),
+                (f'{IMAGE_DIR}/{number}.jpg'
+                 if number < self.options['images'] else ''),
+            )
+
+        self.load('posts', self.options['posts'], build, Post,
+                  ('author_id', 'group_id', 'text', 'pub_date', 'hot_score',
+                   'image'))
+        self.post_ids = array('q', Post.objects.filter(
+            pk__gt=last_pk).order_by('pk').values_list('pk', flat=True))
+
+    def comment(self, row):
+        post, user, text, share = row
+        created = self.now - timedelta(
+            seconds=self.post_ages[post] * (1 - share))
+        return (self.post_ids[post], self.user_ids[user], text, created)
+
+    def follow(self, row):
+        user, author = row
+        if user == author:
+            return None
+        return (self.user_ids[user], self.user_ids[author])
+
+    def vote(self, row):
+        user, post, value = row
+        return (self.user_ids[user], self.post_ids[post], value)
+
+    def relations(self):
+        self.load('comments', self.options['comments'], self.comment,
+                  Comment, ('post_id', 'author_id', 'text', 'created'))
+        self.load('follows', self.options['follows'], self.follow,
+                  Follow, ('user_id', 'author_id'), ignore_conflicts=True)
+        self.load('votes', self.options['votes'], self.vote,
+                  Vote, ('user_id', 'post_id', 'value'),
+                  ignore_conflicts=True)
+
+    def derive(self):
+        started = time.perf_counter()
+        size = self.options['chunk_size']
+        tally = Subquery(
+            Vote.objects.filter(post=OuterRef('pk')).annotate(
+                total=Func(F('value'), function='SUM')).values('total'))
+        for start in range(0, len(self.post_ids), size):
+            batch = self.post_ids[start:start + size]
+            Post.objects.filter(pk__gte=batch[0], pk__lte=batch[-1]).update(
+                raiting=Coalesce(tally, Value(0)))
+        call_command('reconcile_counters', batch_size=size,
+                     stdout=self.stdout)
+        if numpy is not None:
+            call_command('recompute_hot_scores', stdout=self.stdout)
+        if self.post_ids:
+            with transaction.atomic():
+                fulltext.reindex(
+                    Post.objects.filter(pk__gte=self.post_ids[0]))
+        page_cache.invalidate(page_cache.GLOBAL_SCOPE)
+        cache.delete_many([timeline.POPULAR_KEY, timeline.KNOWN_POPULAR_KEY])
+        self.timelines(timeline.popular_authors())
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'== counters, scores, search and timelines in {elapsed:.1f} s ==')
+
+    def timelines(self, popular):
+        """Заполняет ленты подписок пачками INSERT ... SELECT."""
+        ops = connection.ops
+        entry, post, follow = (
+            ops.quote_name(model._meta.db_table)
+            for model in (TimelineEntry, Post, Follow))
+        skip = ', '.join(['%s'] * len(popular))
+        sql = (
+            f'{ops.insert_statement(ignore_conflicts=True)} {entry} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {follow} f JOIN ('
+            'SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+            'PARTITION BY author_id ORDER BY pub_date DESC, id DESC) AS n '
+            f'FROM {post}) p ON p.author_id = f.author_id '
+            'WHERE p.n <= %s AND f.user_id BETWEEN %s AND %s'
+            + (f' AND f.author_id NOT IN ({skip})' if popular else '')
+            + f' {ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+        )
+        size = max(self.options['chunk_size'] // 100, 1)
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(self.user_ids), size):
+                batch = self.user_ids[start:start + size]
+                cursor.execute(sql, [settings.POSTS_TIMELINE_BACKFILL,
+                                     batch[0], batch[-1], *popular])
@@ -1,4 +1,6 @@
-from django.db import IntegrityError
+from contextlib import contextmanager
+
+from django.db import IntegrityError, connection
 
 
 def info(func):
@@ -12,3 +14,27 @@ def info(func):
             self.stdout.write(
                 f'== {self.name} data already exists ... exiting ==')
     return wrapper
+
+
+@contextmanager
+def temporary_database(verbosity=0):
+    """Подменяет основную базу временной тестовой на время блока."""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+@contextmanager
+def explicit_pub_date():
+    """Позволяет задавать pub_date постов вручную при bulk_create."""
+    from posts.models import Post
+
+    field = Post._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.db import migrations
+
+
+VOTE_VALUES = {'like': 1, 'dislike': -1}
+
+
+def forwards(apps, schema_editor):
+    WhoVoted = apps.get_model('posts', 'WhoVoted')
+    Vote = apps.get_model('posts', 'Vote')
+    Post = apps.get_model('posts', 'Post')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    votes = {}
+    for username, post_id, type in WhoVoted.objects.order_by('id').values_list(
+            'username', 'post_id', 'type').iterator():
+        if type in VOTE_VALUES and username and post_id:
+            votes[(username, post_id)] = VOTE_VALUES[type]
+    if not votes:
+        return
+
+    usernames = {username for username, _ in votes}
+    user_ids = dict(User.objects.filter(
+        username__in=usernames).values_list('username', 'id'))
+    post_ids = set(Post.objects.filter(
+        pk__in={post_id for _, post_id in votes}).values_list('id', flat=True))
+    Vote.objects.bulk_create(
+        [
+            Vote(user_id=user_ids[username], post_id=post_id, value=value)
+            for (username, post_id), value in votes.items()
+            if username in user_ids and post_id in post_ids
+        ],
+        batch_size=1000,
+    )
+
+
+def backwards(apps, schema_editor):
+    WhoVoted = apps.get_model('posts', 'WhoVoted')
+    Vote = apps.get_model('posts', 'Vote')
+    types = {value: type for type, value in VOTE_VALUES.items()}
+    WhoVoted.objects.bulk_create(
+        [
+            WhoVoted(username=username, post_id=post_id, type=types[value])
+            for username, post_id, value in Vote.objects.values_list(
+                'user__username', 'post_id', 'value').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_vote'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_whovoted_to_vote'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='WhoVoted',
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:13
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+
+    popular = set(Follow.objects.values('author').annotate(
+        followers=Count('id')).filter(
+        followers__gte=settings.POSTS_FANOUT_LIMIT).values_list(
+        'author', flat=True))
+    entries = []
+    follows = list(Follow.objects.exclude(
+        author__in=popular).values_list('user', 'author'))
+    for user_id, author_id in follows:
+        for post_id, pub_date in Post.objects.filter(
+                author=author_id).values_list('id', 'pub_date'):
+            entries.append(TimelineEntry(
+                user_id=user_id, post_id=post_id,
+                author_id=author_id, pub_date=pub_date))
+            if len(entries) >= 1000:
+                TimelineEntry.objects.bulk_create(entries)
+                entries = []
+    TimelineEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0020_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-pub_date', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-id'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db import migrations
+
+
+SQLITE_FORWARDS = [
+    "CREATE VIRTUAL TABLE posts_post_search "
+    "USING fts5(text, group_title, author_name, tokenize='unicode61')",
+    "INSERT INTO posts_post_search (rowid, text, group_title, author_name) "
+    "SELECT p.id, p.text, coalesce(g.title, ''), "
+    "u.username || ' ' || u.first_name || ' ' || u.last_name "
+    "FROM posts_post p JOIN auth_user u ON u.id = p.author_id "
+    "LEFT JOIN posts_group g ON g.id = p.group_id",
+]
+
+POSTGRES_FORWARDS = [
+    "CREATE TABLE posts_post_search ("
+    "post_id integer PRIMARY KEY REFERENCES posts_post (id) "
+    "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX posts_post_search_document "
+    "ON posts_post_search USING GIN (document)",
+    "INSERT INTO posts_post_search (post_id, document) "
+    "SELECT p.id, "
+    "setweight(to_tsvector(%(config)s::regconfig, p.text), 'A') || "
+    "setweight(to_tsvector(%(config)s::regconfig, "
+    "coalesce(g.title, '')), 'B') || "
+    "setweight(to_tsvector(%(config)s::regconfig, concat_ws(' ', "
+    "u.username, u.first_name, u.last_name)), 'B') "
+    "FROM posts_post p JOIN auth_user u ON u.id = p.author_id "
+    "LEFT JOIN posts_group g ON g.id = p.group_id",
+]
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = SQLITE_FORWARDS
+    elif vendor == 'postgresql':
+        statements = POSTGRES_FORWARDS
+    else:
+        return
+    params = {'config': settings.POSTS_SEARCH_CONFIG}
+    for statement in statements:
+        schema_editor.execute(
+            statement, params if '%(config)s' in statement else None)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE posts_post_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:39
+
+from django.db import migrations, models
+from django.db.models import F, Func, OuterRef, Subquery
+
+
+def fill_comment_counts(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(comment_count=Subquery(
+        Comment.objects.filter(post=OuterRef('pk')).annotate(
+            total=Func(F('pk'), function='COUNT')).values('total'),
+        output_field=models.IntegerField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_comment_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_comment_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:42
+
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+BATCH_SIZE = 500
+
+
+def fill_hot_scores(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    last_pk = 0
+    while True:
+        scores = {}
+        rows = Post.objects.filter(pk__gt=last_pk).order_by(
+            'pk').values_list('pk', 'raiting', 'pub_date')[:BATCH_SIZE]
+        for pk, raiting, pub_date in rows.iterator():
+            sign = (raiting > 0) - (raiting < 0)
+            scores[pk] = (
+                sign * math.log10(max(abs(raiting), 1))
+                + (pub_date - EPOCH).total_seconds()
+                / settings.POSTS_HOT_SCORE_DECAY
+            )
+            last_pk = pk
+        if not scores:
+            break
+        Post.objects.filter(pk__in=scores).update(hot_score=Case(
+            *[When(pk=pk, then=Value(score)) for pk, score in scores.items()],
+            output_field=models.FloatField(),
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0026_post_comment_count'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_raiting_pub_date_idx',
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_hot_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='post_hot_score_idx'),
+        ),
+    ]
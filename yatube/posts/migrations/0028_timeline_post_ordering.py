@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0027_post_hot_score'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='timelineentry',
+            options={'ordering': ['-pub_date', '-post']},
+        ),
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_user_pub_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:14
+
+from django.db import migrations, models
+from django.db.models import F, Func, OuterRef, Subquery
+
+
+def count_of(queryset):
+    return Subquery(
+        queryset.annotate(
+            total=Func(F('pk'), function='COUNT')).values('total'),
+        output_field=models.IntegerField(),
+    )
+
+
+def fill_follow_counts(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Profile = apps.get_model('users', 'Profile')
+    Profile.objects.update(
+        followers_count=count_of(
+            Follow.objects.filter(author=OuterRef('user_id'))),
+        following_count=count_of(
+            Follow.objects.filter(user=OuterRef('user_id'))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0028_timeline_post_ordering'),
+        ('users', '0001_profile'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_follow_counts, migrations.RunPython.noop),
+    ]
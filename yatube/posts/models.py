@@ -1,3 +1,6 @@
+import hashlib
+import json
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
@@ -14,6 +17,15 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        return self.select_related('author', 'group').only(
+            'text', 'pub_date', 'raiting', 'image', 'thumbnails',
+            'comment_count', 'author__username', 'author__first_name',
+            'author__last_name', 'group__slug', 'group__title',
+        ).order_by('-pub_date')
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
@@ -34,18 +46,74 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    thumbnails = models.TextField(blank=True, default='', editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    hot_score = models.FloatField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def thumbnail_urls(self):
+        urls = json.loads(self.thumbnails or '{}')
+        if not self.image or urls.get('source') != self.image.name:
+            return {}
+        return urls
+
+    @property
+    def card_version(self):
+        parts = [
+            self.text, self.image.name, self.raiting,
+            self.comment_count,
+            self.author.username, self.author.get_full_name(),
+        ]
+        if self.group_id:
+            parts += [self.group.slug, self.group.title]
+        raw = '|'.join(map(str, parts))
+        return hashlib.md5(raw.encode()).hexdigest()
+
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=['-hot_score', '-id'], name='post_hot_score_idx'),
+        ]
+
 
+class Vote(models.Model):
+    LIKE = 1
+    DISLIKE = -1
+    VALUE_CHOICES = (
+        (LIKE, 'like'),
+        (DISLIKE, 'dislike'),
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='votes',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='votes',
+    )
+    value = models.SmallIntegerField(choices=VALUE_CHOICES)
 
-class WhoVoted(models.Model):
-    username = models.TextField(null=True)
-    post_id = models.IntegerField(null=True)
-    type = models.TextField(null=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_vote'),
+        ]
 
 
 class Comment(models.Model):
@@ -62,6 +130,13 @@ class Comment(models.Model):
     )
     created = models.DateTimeField(auto_now_add=True,)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -74,3 +149,93 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'),
+        ]
+
+
+class BulkJob(models.Model):
+    DELETE = 'delete'
+    MOVE = 'move'
+    ACTION_CHOICES = (
+        (DELETE, 'Удалить посты'),
+        (MOVE, 'Перенести посты в группу'),
+    )
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+    action = models.CharField(max_length=16, choices=ACTION_CHOICES)
+    group = models.ForeignKey(
+        Group,
+        blank=True, null=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+    )
+    post_ids = models.TextField(editable=False)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    last_post_id = models.PositiveIntegerField(default=0)
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        User,
+        blank=True, null=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    heartbeat = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created']
+
+    def __str__(self):
+        return f'{self.get_action_display()} №{self.pk}'
+
+    @property
+    def progress(self):
+        if not self.total:
+            return 100
+        return self.processed * 100 // self.total
@@ -0,0 +1,95 @@
+import hashlib
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+INDEX_SCOPE = 'index'
+BEST_SCOPE = 'best'
+GROUP_SCOPE = 'group:{slug}'
+PROFILE_SCOPE = 'profile:{username}'
+GLOBAL_SCOPE = 'all'
+
+VERSION_KEY = 'page_cache:version:{}'
+PAGE_KEY = 'page_cache:page:{}'
+HITS_KEY = 'page_cache:hits'
+MISSES_KEY = 'page_cache:misses'
+PAGE_PARAMS = ('page', 'cursor')
+
+CSRF_TOKEN = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = '__csrf_token__'
+
+
+def count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def versions(scopes):
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def invalidate(*scopes):
+    for scope in scopes:
+        try:
+            cache.incr(VERSION_KEY.format(scope))
+        except ValueError:
+            pass
+
+
+def page_key(view_name, scopes, request):
+    params = [
+        f'{name}={request.GET.get(name, "")}' for name in PAGE_PARAMS
+    ]
+    raw = '|'.join([view_name, *scopes, *params,
+                    *map(str, versions(scopes))])
+    return PAGE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def stats():
+    return {
+        'hits': cache.get(HITS_KEY, 0),
+        'misses': cache.get(MISSES_KEY, 0),
+    }
+
+
+def cache_anonymous_page(scope):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            scopes = [GLOBAL_SCOPE, scope.format(**kwargs)]
+            key = page_key(view.__name__, scopes, request)
+            content = cache.get(key)
+            if content is None:
+                count(MISSES_KEY)
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                content = CSRF_TOKEN.sub(
+                    rf'\g<1>{CSRF_PLACEHOLDER}\g<2>',
+                    response.content.decode(response.charset))
+                cache.set(key, content, settings.POSTS_PAGE_CACHE_TIMEOUT)
+                response['X-Page-Cache'] = 'MISS'
+                return response
+            count(HITS_KEY)
+            response = HttpResponse(
+                content.replace(CSRF_PLACEHOLDER, get_token(request)))
+            response['X-Page-Cache'] = 'HIT'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,36 @@
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import Case, FloatField, Value, When
+
+from . import leaderboards
+from .models import Post
+
+EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+
+def hot_score(raiting, pub_date):
+    """Оценка «горячести» поста по рейтингу и времени публикации."""
+    order = math.log10(max(abs(raiting), 1))
+    sign = (raiting > 0) - (raiting < 0)
+    seconds = (pub_date - EPOCH).total_seconds()
+    return sign * order + seconds / settings.POSTS_HOT_SCORE_DECAY
+
+
+def write(scores):
+    Post.objects.filter(pk__in=scores).update(hot_score=Case(
+        *[When(pk=pk, then=Value(score)) for pk, score in scores.items()],
+        output_field=FloatField(),
+    ))
+
+
+def update(post_ids):
+    """Пересчитывает оценки постов по их текущему рейтингу и их топы."""
+    posts = list(Post.objects.filter(pk__in=post_ids).only(
+        'raiting', 'pub_date', 'group_id'))
+    for post in posts:
+        post.hot_score = hot_score(post.raiting, post.pub_date)
+    if posts:
+        write({post.pk: post.hot_score for post in posts})
+        leaderboards.update(posts)
@@ -0,0 +1,276 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from users.models import Profile
+
+from . import (background, counters, feed_counts, fulltext, leaderboards,
+               page_cache, ranking, suggest, thumbnails, timeline)
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+AUTHOR_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    """Запоминает прежнюю группу поста: при переносе сбрасываются обе."""
+    instance._previous_group = None
+    if not instance._state.adding:
+        instance._previous_group = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', 'group__slug').first()
+
+
+def moved_from(post):
+    """Слаг прежней группы поста, если пост из нее перенесли."""
+    previous = previous_group(post)
+    return previous and previous[1]
+
+
+def previous_group(post):
+    """(id, слаг) прежней группы поста, если пост из нее перенесли."""
+    previous = getattr(post, '_previous_group', None)
+    if previous and previous[0] and previous[0] != post.group_id:
+        return previous
+    return None
+
+
+@receiver(pre_save, sender=User)
+def remember_author_name(sender, instance, update_fields, **kwargs):
+    """Запоминает прежние имя и логин: от них зависят индекс и профиль."""
+    instance._previous_name = None
+    if instance._state.adding or not author_name_changed(update_fields):
+        return
+    instance._previous_name = User.objects.filter(
+        pk=instance.pk).values_list(*AUTHOR_NAME_FIELDS).first()
+
+
+def renamed(user):
+    previous = getattr(user, '_previous_name', None)
+    return bool(previous) and previous != tuple(
+        getattr(user, name) for name in AUTHOR_NAME_FIELDS)
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_title(sender, instance, **kwargs):
+    instance._previous_title = None
+    if not instance._state.adding:
+        instance._previous_title = Group.objects.filter(
+            pk=instance.pk).values_list('title', flat=True).first()
+
+
+def post_count_keys(post):
+    keys = [feed_counts.index_key(), feed_counts.author_key(post.author_id)]
+    if post.group_id:
+        keys.append(feed_counts.group_key(post.group.slug))
+    return keys
+
+
+def follower_count_keys(post):
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    return [feed_counts.follow_key(user_id) for user_id in followers]
+
+
+@receiver(post_save, sender=Post)
+def update_feed_counts(sender, instance, created, **kwargs):
+    if created:
+        feed_counts.bump(post_count_keys(instance), 1)
+        cache.delete_many(follower_count_keys(instance))
+    else:
+        slugs = [moved_from(instance)]
+        if instance.group_id:
+            slugs.append(instance.group.slug)
+        cache.delete_many(
+            [feed_counts.group_key(slug) for slug in slugs if slug])
+
+
+@receiver(post_delete, sender=Post)
+def decrease_feed_counts(sender, instance, **kwargs):
+    feed_counts.bump(post_count_keys(instance), -1)
+    cache.delete_many(follower_count_keys(instance))
+
+
+@receiver(pre_save, sender=Post)
+def score_new_post(sender, instance, **kwargs):
+    """Оценка нового поста пишется тем же INSERT, без отдельного UPDATE."""
+    if instance._state.adding:
+        instance.hot_score = ranking.hot_score(
+            instance.raiting, instance.pub_date or timezone.now())
+
+
+@receiver(post_save, sender=Post)
+def add_to_leaderboards(sender, instance, created, **kwargs):
+    if created:
+        leaderboards.update([instance])
+        return
+    previous = previous_group(instance)
+    if previous:
+        leaderboards.moved(instance, previous[0])
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_leaderboards(sender, instance, **kwargs):
+    leaderboards.remove(instance)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, **kwargs):
+    if instance.image and not instance.thumbnail_urls:
+        background.submit(thumbnails.generate, instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def increase_comment_count(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrease_comment_count(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+
+
+def invalidate_author_profile(follow):
+    username = User.objects.filter(
+        pk=follow.author_id).values_list('username', flat=True).first()
+    if username is not None:
+        page_cache.invalidate(
+            page_cache.PROFILE_SCOPE.format(username=username))
+
+
+@receiver(post_save, sender=Follow)
+def increase_follow_counts(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_follow(instance, 1)
+        invalidate_author_profile(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def decrease_follow_counts(sender, instance, **kwargs):
+    counters.bump_follow(instance, -1)
+    invalidate_author_profile(instance)
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def reset_follow_count(sender, instance, **kwargs):
+    cache.delete(feed_counts.follow_key(instance.user_id))
+
+
+def post_page_scopes(post):
+    scopes = [
+        page_cache.INDEX_SCOPE,
+        page_cache.BEST_SCOPE,
+        page_cache.PROFILE_SCOPE.format(username=post.author.username),
+    ]
+    if post.group_id:
+        scopes.append(page_cache.GROUP_SCOPE.format(slug=post.group.slug))
+    old_slug = moved_from(post)
+    if old_slug:
+        scopes.append(page_cache.GROUP_SCOPE.format(slug=old_slug))
+    return scopes
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    page_cache.invalidate(*post_page_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    post = Post.objects.select_related('author', 'group').only(
+        'author__username', 'group__slug').filter(pk=instance.post_id).first()
+    if post is not None:
+        page_cache.invalidate(*post_page_scopes(post))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    page_cache.invalidate(page_cache.GLOBAL_SCOPE)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    fulltext.index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    fulltext.remove(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def reindex_group_posts(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_title', None)
+    if not created and previous is not None and previous != instance.title:
+        background.submit(fulltext.reindex, instance.posts.all())
+
+
+def author_name_changed(update_fields):
+    return not update_fields or any(
+        name in update_fields for name in AUTHOR_NAME_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def reindex_author_posts(sender, instance, created, **kwargs):
+    if not created and renamed(instance):
+        background.submit(fulltext.reindex, instance.posts.all())
+
+
+@receiver(post_save, sender=User)
+def invalidate_renamed_profile(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_name', None)
+    if not created and previous and previous[0] != instance.username:
+        page_cache.invalidate(
+            page_cache.PROFILE_SCOPE.format(username=previous[0]),
+            page_cache.PROFILE_SCOPE.format(username=instance.username))
+
+
+@receiver(post_save, sender=User)
+def update_author_suggestions(sender, instance, update_fields, **kwargs):
+    if author_name_changed(update_fields):
+        suggest.author_changed(instance)
+
+
+@receiver(post_delete, sender=User)
+def remove_author_suggestions(sender, instance, **kwargs):
+    suggest.removed(suggest.AUTHOR, instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def update_group_suggestions(sender, instance, **kwargs):
+    suggest.group_changed(instance)
+
+
+@receiver(post_delete, sender=Group)
+def remove_group_suggestions(sender, instance, **kwargs):
+    suggest.removed(suggest.GROUP, instance.pk)
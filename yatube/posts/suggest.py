@@ -0,0 +1,223 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.urls import NoReverseMatch, reverse
+from django.utils.http import urlencode
+
+from . import background, fulltext
+from .models import Group
+
+User = get_user_model()
+
+SEQ_KEY = 'suggest:seq'
+EVENT_KEY = 'suggest:event:{}'
+EVENT_TIMEOUT = 60 * 60
+SCAN_LIMIT = 200
+
+AUTHOR = 'author'
+GROUP = 'group'
+TERM = 'term'
+
+
+class PrefixIndex:
+    """Отсортированный список (термин, вид, id) с поиском по префиксу."""
+
+    def __init__(self):
+        self.keys = []
+        self.items = {}
+
+    def add(self, kind, pk, terms, label, url, weight=None):
+        if weight is None:
+            previous = self.items.get((kind, pk))
+            weight = previous[3] if previous else 0
+        self.remove(kind, pk)
+        terms = {term.lower() for term in terms if term}
+        self.items[(kind, pk)] = (terms, label, url, weight)
+        for term in terms:
+            bisect.insort(self.keys, (term, kind, pk))
+
+    def remove(self, kind, pk):
+        item = self.items.pop((kind, pk), None)
+        if item is None:
+            return
+        for term in item[0]:
+            position = bisect.bisect_left(self.keys, (term, kind, pk))
+            del self.keys[position]
+
+    def search(self, prefix, limit=10):
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        found = {}
+        start = bisect.bisect_left(self.keys, (prefix,))
+        for term, kind, pk in self.keys[start:start + SCAN_LIMIT]:
+            if not term.startswith(prefix):
+                break
+            found[(kind, pk)] = self.items[(kind, pk)]
+        ranked = sorted(found.items(), key=lambda entry: -entry[1][3])
+        return [
+            {'kind': kind, 'label': label, 'url': url}
+            for (kind, _), (_, label, url, _) in ranked[:limit]
+        ]
+
+
+def author_item(user, weight=None):
+    try:
+        url = reverse('posts:profile', args=[user.username])
+    except NoReverseMatch:
+        return None
+    return (AUTHOR, user.pk, [user.username], user.username, url, weight)
+
+
+def group_item(group, weight=None):
+    try:
+        url = reverse('posts:group_posts', args=[group.slug])
+    except NoReverseMatch:
+        return None
+    return (GROUP, group.pk, [group.slug, group.title, *group.title.split()],
+            group.title, url, weight)
+
+
+def term_item(term, weight):
+    url = reverse('posts:search') + '?' + urlencode({'q': term})
+    return (TERM, term, [term], term, url, weight)
+
+
+def frequent_terms(limit):
+    if connection.vendor == 'sqlite':
+        sql = (
+            'CREATE VIRTUAL TABLE IF NOT EXISTS temp.posts_search_vocab '
+            f'USING fts5vocab(main, {fulltext.TABLE}, row)',
+            'SELECT term, doc FROM temp.posts_search_vocab '
+            'WHERE length(term) >= 3 ORDER BY doc DESC LIMIT %s',
+        )
+    elif connection.vendor == 'postgresql':
+        sql = (
+            None,
+            'SELECT word, ndoc FROM ts_stat('
+            f"'SELECT document FROM {fulltext.TABLE}') "
+            'WHERE length(word) >= 3 ORDER BY ndoc DESC LIMIT %s',
+        )
+    else:
+        return []
+    create, select = sql
+    with connection.cursor() as cursor:
+        if create:
+            cursor.execute(create)
+        cursor.execute(select, [limit])
+        return [(term, weight) for term, weight in cursor.fetchall()
+                if term.isalpha()]
+
+
+def build():
+    index = PrefixIndex()
+    authors = User.objects.annotate(weight=Count('posts')).only('username')
+    items = [
+        *(author_item(user, user.weight) for user in authors.iterator()),
+        *(group_item(group, group.weight) for group in
+          Group.objects.annotate(weight=Count('posts')).iterator()),
+        *(term_item(term, weight) for term, weight in
+          frequent_terms(settings.POSTS_SUGGEST_TERMS)),
+    ]
+    for item in filter(None, items):
+        index.add(*item)
+    return index
+
+
+class Suggestions:
+    """Индекс подсказок процесса, обновляемый по журналу в кеше."""
+
+    def __init__(self):
+        self.index = None
+        self.seq = 0
+        self.built = 0
+        self.building = False
+        self.lock = threading.RLock()
+
+    def rebuild(self):
+        seq = cache.get(SEQ_KEY) or 0
+        try:
+            index = build()
+        except Exception:
+            with self.lock:
+                self.building = False
+            raise
+        with self.lock:
+            self.index, self.seq = index, seq
+            self.built = time.monotonic()
+            self.building = False
+
+    def schedule(self):
+        """Ставит перестройку в фоновый пул, если она еще не идет."""
+        if not self.building:
+            self.building = True
+            background.submit(self.rebuild)
+
+    def sync(self):
+        stale = (self.index is None or time.monotonic() - self.built
+                 >= settings.POSTS_SUGGEST_REBUILD_INTERVAL)
+        if stale:
+            self.schedule()
+        if self.index is None:
+            return
+        seq = cache.get(SEQ_KEY) or 0
+        if seq <= self.seq:
+            if seq < self.seq:
+                self.schedule()
+            return
+        keys = [EVENT_KEY.format(n) for n in range(self.seq + 1, seq + 1)]
+        events = cache.get_many(keys)
+        if len(events) != len(keys):
+            self.schedule()
+            return
+        for key in keys:
+            action, item = events[key]
+            if action == 'add':
+                self.index.add(*item)
+            else:
+                self.index.remove(*item)
+        self.seq = seq
+
+    def search(self, prefix, limit=10):
+        with self.lock:
+            self.sync()
+            if self.index is None:
+                return []
+            return self.index.search(prefix, limit)
+
+
+suggestions = Suggestions()
+
+
+def publish(action, item):
+    try:
+        seq = cache.incr(SEQ_KEY)
+    except ValueError:
+        cache.add(SEQ_KEY, 0, None)
+        seq = cache.incr(SEQ_KEY)
+    cache.set(EVENT_KEY.format(seq), (action, item), EVENT_TIMEOUT)
+
+
+def changed(kind, pk, item):
+    if item is None:
+        removed(kind, pk)
+    else:
+        publish('add', item)
+
+
+def author_changed(user):
+    changed(AUTHOR, user.pk, author_item(user))
+
+
+def group_changed(group):
+    changed(GROUP, group.pk, group_item(group))
+
+
+def removed(kind, pk):
+    publish('remove', (kind, pk))
@@ -1,11 +1,13 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.contrib.auth import get_user_model
 from django.test import TestCase, Client, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django.conf import settings
+from PIL import Image
 from ..models import Group, Post
 
 
@@ -83,6 +85,71 @@ class TaskPagesTests(TestCase):
         self.assertEqual('Измененный пост', post_list.text)
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def image(self, name, size, **options):
+        content = BytesIO()
+        Image.new('RGB', size, 'red').save(content, 'JPEG', **options)
+        return SimpleUploadedFile(
+            name=name, content=content.getvalue(), content_type='image/jpeg')
+
+    def create_post(self, image):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост с картинкой', 'image': image})
+
+    @override_settings(POSTS_IMAGE_MAX_BYTES=100)
+    def test_too_large_file_rejected(self):
+        """Файл больше POSTS_IMAGE_MAX_BYTES не сохраняется."""
+        response = self.create_post(self.image('big.jpg', (50, 50)))
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 0 МБ.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=10 ** 6)
+    def test_too_many_pixels_rejected(self):
+        """Картинка больше POSTS_IMAGE_MAX_PIXELS не сохраняется."""
+        response = self.create_post(self.image('huge.jpg', (1001, 1000)))
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 1 мегапикселей.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=100)
+    def test_image_downscaled_without_exif(self):
+        """Крупная картинка уменьшается, EXIF удаляется."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        self.create_post(self.image('photo.jpg', (300, 200), exif=exif))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 67))
+            self.assertNotIn('exif', image.info)
+
+    def test_small_image_kept(self):
+        """Небольшая картинка без EXIF сохраняется как есть."""
+        upload = self.image('small.jpg', (30, 20))
+        content = upload.read()
+        upload.seek(0)
+        self.create_post(upload)
+        post = Post.objects.get()
+        with open(post.image.path, 'rb') as image:
+            self.assertEqual(image.read(), content)
+
+
 class TaskCommentTests(TestCase):
 
     @classmethod
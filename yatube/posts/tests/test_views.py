@@ -1,15 +1,40 @@
+import contextlib
+import json
+import os
 import shutil
 import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipIf
 
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 from django.conf import settings
-from ..models import Group, Post, Follow
+from .. import (bulk_jobs, feed_counts, fulltext, leaderboards, page_cache,
+                ranking, suggest, timeline, vote_buffer)
+from ..management.commands import benchmark_views
+from ..management.commands.recompute_hot_scores import numpy
+from ..management.commands.utils import explicit_pub_date
+from ..models import (BulkJob, Comment, Follow, Group, Post, TimelineEntry,
+                      Vote)
+from .. import thumbnail_kvstore
+from ..thumbnail_kvstore import KVStore
+from ..views import NUMB_COMMENTS, NUMB_POSTS
+from users.models import Profile
 from django import forms
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from django.test.utils import CaptureQueriesContext
 
 
 User = get_user_model()
@@ -164,6 +189,157 @@ class TaskPaginatorTests(TestCase):
                 self.assertEqual((len(response.context['page_obj'])), 3)
 
 
+class TaskFeedCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_feed_count_cached(self):
+        """Число постов кешируется и обновляется сигналами."""
+        self.guest_client.get(reverse('posts:main'))
+        self.assertEqual(cache.get(feed_counts.index_key()), 0)
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group)
+        self.assertEqual(cache.get(feed_counts.index_key()), 1)
+        post.delete()
+        self.assertEqual(cache.get(feed_counts.index_key()), 0)
+
+    def test_page_beyond_stale_count(self):
+        """Устаревший счетчик не прячет существующие страницы."""
+        cache.set(feed_counts.index_key(), 0)
+        Post.objects.bulk_create([
+            Post(author=self.user, text='Тестовый пост') for _ in range(13)
+        ])
+        response = self.guest_client.get(reverse('posts:main') + '?page=2')
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_moved_post_resets_both_groups(self):
+        """Перенос поста сбрасывает счетчики старой и новой группы."""
+        other = Group.objects.create(
+            title='Другая группа', slug='other-slug', description='-')
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group)
+        for slug in ('test-slug', 'other-slug'):
+            self.guest_client.get(
+                reverse('posts:group_posts', kwargs={'slug': slug}))
+        self.assertEqual(
+            cache.get(feed_counts.group_key('test-slug')), 1)
+        post.group = other
+        post.save()
+        self.assertIsNone(cache.get(feed_counts.group_key('test-slug')))
+        self.assertIsNone(cache.get(feed_counts.group_key('other-slug')))
+
+
+class TaskFeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{i}', first_name='Имя', last_name='Фамилия')
+            for i in range(NUMB_POSTS)
+        ]
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for user in cls.users:
+            post = Post.objects.create(
+                author=user, text='Тестовый пост', group=cls.group)
+            Comment.objects.create(post=post, author=user, text='Коммент')
+            Follow.objects.create(user=cls.users[0], author=user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.users[0])
+
+    def test_feed_queries_constant(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        pages = [
+            (self.guest_client, reverse('posts:main'), 2),
+            (self.guest_client, reverse(
+                'posts:group_posts', kwargs={'slug': self.group.slug}), 3),
+            (self.guest_client, reverse(
+                'posts:profile', kwargs={'username': self.users[0]}), 3),
+            (self.guest_client, reverse('posts:best'), 2),
+            (self.authorized_client, reverse('posts:follow_index'), 6),
+        ]
+        for client, reverse_name, queries in pages:
+            with self.subTest(reverse_name=reverse_name):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = client.get(reverse_name)
+                self.assertEqual(
+                    response.context['page_obj'][0].comment_count, 1)
+
+
+@override_settings(POSTS_CURSOR_PAGINATION=True)
+class TaskCursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        bulk_list = [
+            Post(author=cls.user, text=f'Тестовый пост {i}', group=cls.group)
+            for i in range(13)
+        ]
+        Post.objects.bulk_create(bulk_list)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_cursor_paginator(self):
+        """Курсор листает ленты вперед и назад без пропусков."""
+        templates_pages_names = [
+            reverse('posts:main'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        ]
+        for reverse_name in templates_pages_names:
+            with self.subTest(reverse_name=reverse_name):
+                first = self.authorized_client.get(reverse_name)
+                first_page = first.context['page_obj']
+                self.assertEqual(len(first_page), 10)
+                self.assertFalse(first_page.has_previous())
+                second = self.authorized_client.get(
+                    reverse_name + '?cursor=' + first_page.next_cursor)
+                second_page = second.context['page_obj']
+                self.assertEqual(len(second_page), 3)
+                self.assertFalse(second_page.has_next())
+                seen = {post.pk for post in first_page}
+                seen |= {post.pk for post in second_page}
+                self.assertEqual(len(seen), 13)
+                back = self.authorized_client.get(
+                    reverse_name + '?cursor=' + second_page.previous_cursor)
+                self.assertEqual(
+                    list(back.context['page_obj']), list(first_page))
+
+    def test_cursor_paginator_bad_cursor(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.authorized_client.get(
+            reverse('posts:main') + '?cursor=broken')
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
 class TaskNewPostTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -224,7 +400,7 @@ class TaskNewPostTests(TestCase):
         self.assertNotEqual(first_object.group, self.post.group)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_BACKGROUND_WORKERS=0)
 class TaskImageTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -282,6 +458,302 @@ class TaskImageTests(TestCase):
         object = response.context['post']
         self.assertEqual(object.image, self.post.image)
 
+    @override_settings(POSTS_IMAGE_MAX_BYTES=2 ** 20)
+    def test_too_large_image_rejected(self):
+        """Слишком большой файл отбрасывается, а форма объясняет почему."""
+        image = BytesIO()
+        Image.effect_noise((1200, 1200), 100).save(image, format='PNG')
+        count = Post.objects.count()
+        response = self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'Пост с большой картинкой',
+            'image': SimpleUploadedFile('big.png', image.getvalue(),
+                                        content_type='image/png'),
+        })
+        self.assertEqual(Post.objects.count(), count)
+        self.assertFormError(response, 'form', 'image', 'Файл больше 1 МБ.')
+        self.assertEqual(response.context['form']['text'].value(),
+                         'Пост с большой картинкой')
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=16)
+    def test_large_image_downscaled(self):
+        """Картинка больше POSTS_IMAGE_MAX_SIDE уменьшается при загрузке."""
+        image = BytesIO()
+        Image.new('RGB', (64, 32)).save(image, format='PNG')
+        self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'Пост с широкой картинкой',
+            'image': SimpleUploadedFile('wide.png', image.getvalue(),
+                                        content_type='image/png'),
+        })
+        post = Post.objects.get(text='Пост с широкой картинкой')
+        self.assertEqual((post.image.width, post.image.height), (16, 8))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_BACKGROUND_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo')
+        cls.small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, name):
+        return SimpleUploadedFile(
+            name=name, content=self.small_gif, content_type='image/gif')
+
+    def test_thumbnails_generated_on_save(self):
+        """Миниатюры считаются при сохранении и выводятся в шаблонах."""
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост',
+            image=self.upload('thumb.gif'))
+        post.refresh_from_db()
+        urls = post.thumbnail_urls
+        self.assertEqual(set(urls), {'source', 'card', 'detail', 'srcset'})
+        self.assertTrue(urls['srcset']['jpeg'].endswith(' 320w'))
+        pages = {
+            reverse('posts:main'): urls['card'],
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}):
+                urls['detail'],
+        }
+        for reverse_name, url in pages.items():
+            with self.subTest(reverse_name=reverse_name):
+                response = Client().get(reverse_name)
+                self.assertContains(response, f'src="{url}"')
+        response = Client().get(reverse('posts:main'))
+        self.assertContains(
+            response, f'srcset="{urls["srcset"]["jpeg"]}"')
+
+    def test_thumbnails_follow_new_image(self):
+        """После замены картинки старые миниатюры не используются."""
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост',
+            image=self.upload('first.gif'))
+        post.refresh_from_db()
+        old_urls = post.thumbnail_urls
+        post.image = self.upload('second.gif')
+        self.assertEqual(post.thumbnail_urls, {})
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail_urls['source'], post.image.name)
+        self.assertNotEqual(post.thumbnail_urls['card'], old_urls['card'])
+
+    def test_generate_thumbnails_command(self):
+        """Команда generate_thumbnails дополняет старые посты вариантами."""
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост',
+            image=self.upload('old.gif'))
+        Post.objects.filter(pk=post.pk).update(thumbnails='')
+        call_command('generate_thumbnails', workers=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertIn('srcset', post.thumbnail_urls)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_BACKGROUND_WORKERS=0)
+class ThumbnailKVStoreTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        for number in range(3):
+            Post.objects.create(
+                author=cls.user, text='Тестовый пост',
+                image=SimpleUploadedFile(
+                    name=f'kv{number}.gif', content=small_gif,
+                    content_type='image/gif'))
+        Post.objects.update(thumbnails='')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_feed_thumbnails_prefetched(self):
+        """Миниатюры страницы загружаются из хранилища одним запросом."""
+        self.authorized_client.get(reverse('posts:main'))
+        cache.clear()
+        with mock.patch.object(
+                KVStore, '_fetch', autospec=True,
+                side_effect=KVStore._fetch) as fetch:
+            response = self.authorized_client.get(reverse('posts:main'))
+        self.assertEqual(fetch.call_count, 1)
+        self.assertContains(response, 'src="/media/cache/', count=3)
+
+    def test_memo_bounded_outside_requests(self):
+        """Вне запросов память хранилища ограничена последними ключами."""
+        memo = thumbnail_kvstore.memo()
+        memo.clear()
+        with mock.patch.object(thumbnail_kvstore, 'MEMO_SIZE', 2):
+            for key in ('a', 'b', 'c'):
+                memo[key] = key
+            memo['b']
+            memo['d'] = 'd'
+        self.assertEqual(list(memo), ['b', 'd'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_BACKGROUND_WORKERS=0)
+class MediaCacheGCTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo')
+        cls.small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name):
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост',
+            image=SimpleUploadedFile(
+                name=name, content=self.small_gif, content_type='image/gif'))
+        post.refresh_from_db()
+        return post
+
+    def thumbnail_paths(self, post):
+        return [
+            os.path.join(TEMP_MEDIA_ROOT, url[len(settings.MEDIA_URL):])
+            for url in (post.thumbnail_urls['card'],
+                        post.thumbnail_urls['detail'])
+        ]
+
+    def gc(self, **options):
+        out = StringIO()
+        call_command('gc_media_cache', min_age=0, stdout=out, **options)
+        return out.getvalue()
+
+    def test_orphans_removed(self):
+        """Миниатюры удаленных постов удаляются, живые остаются."""
+        live = self.create_post('live.gif')
+        dead = self.create_post('dead.gif')
+        dead_paths = self.thumbnail_paths(dead)
+        dead.delete()
+        output = self.gc(dry_run=True)
+        self.assertIn('Would reclaim', output)
+        self.assertTrue(all(map(os.path.exists, dead_paths)))
+        self.gc()
+        self.assertFalse(any(map(os.path.exists, dead_paths)))
+        self.assertTrue(all(map(os.path.exists, self.thumbnail_paths(live))))
+        self.assertIn('0 files', self.gc())
+
+    def test_recent_files_kept(self):
+        """Свежие файлы не удаляются, пока не старше --min-age."""
+        dead = self.create_post('fresh.gif')
+        dead_paths = self.thumbnail_paths(dead)
+        dead.delete()
+        call_command('gc_media_cache', stdout=StringIO())
+        self.assertTrue(all(map(os.path.exists, dead_paths)))
+
+
+@override_settings(POSTS_BACKGROUND_WORKERS=0)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='neo', first_name='Томас', last_name='Андерсон')
+        cls.group = Group.objects.create(
+            title='Матрица', slug='matrix', description='Тестовое описание')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Следуй за белым кроликом',
+            group=cls.group)
+        cls.other = Post.objects.create(
+            author=User.objects.create_user(username='smith'),
+            text='Неизбежность кролика')
+
+    def search(self, query, **params):
+        response = Client().get(
+            reverse('posts:search'), {'q': query, **params})
+        return list(response.context['page_obj'])
+
+    def test_search_fields(self):
+        """Поиск идет по тексту, названию группы и имени автора."""
+        cases = {
+            'белым': [self.post],
+            'МАТРИЦА': [self.post],
+            'андерсон': [self.post],
+            'smith': [self.other],
+            'кролик': [self.post, self.other],
+            '"': [],
+        }
+        for query, posts in cases.items():
+            with self.subTest(query=query):
+                self.assertCountEqual(self.search(query), posts)
+                self.assertCountEqual(
+                    fulltext.filter_posts(Post.objects.all(), query), posts)
+
+    def test_index_updated_by_signals(self):
+        """Индекс обновляется при изменении и удалении постов и групп."""
+        self.post.text = 'Синяя таблетка'
+        self.post.save()
+        self.assertEqual(self.search('таблетка'), [self.post])
+        self.assertEqual(self.search('белым'), [])
+        self.group.title = 'Зион'
+        self.group.save()
+        self.assertEqual(self.search('зион'), [self.post])
+        self.user.last_name = 'Нео'
+        self.user.save()
+        self.assertEqual(self.search('нео'), [self.post])
+        Post.objects.filter(pk=self.other.pk).delete()
+        self.assertEqual(self.search('неизбежность'), [])
+
+    def test_unrelated_changes_not_reindexed(self):
+        """Пароль и описание группы не переиндексируют посты."""
+        user = User.objects.get(pk=self.user.pk)
+        group = Group.objects.get(pk=self.group.pk)
+        with mock.patch.object(fulltext, 'reindex') as reindex:
+            user.set_password('matrix')
+            user.save()
+            group.description = 'Новое описание'
+            group.save()
+            reindex.assert_not_called()
+
+    def test_search_paginated(self):
+        """Страницы поиска сохраняют запрос в ссылках пагинатора."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Кролик {number}')
+            for number in range(NUMB_POSTS + 1))
+        fulltext.reindex(Post.objects.all())
+        response = Client().get(reverse('posts:search'), {'q': 'кролик'})
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         NUMB_POSTS + 3)
+        self.assertEqual(len(response.context['page_obj']), NUMB_POSTS)
+        self.assertContains(
+            response, '?q=%D0%BA%D1%80%D0%BE%D0%BB%D0%B8%D0%BA&page=2')
+        self.assertEqual(len(self.search('кролик', page=2)), 3)
+
 
 class FollowingTests(TestCase):
     @classmethod
@@ -345,3 +817,987 @@ class FollowingTests(TestCase):
             kwargs={'username': self.user2}))
         follow_count2 = Follow.objects.count()
         self.assertEqual(follow_count1, follow_count2)
+
+
+@override_settings(POSTS_BACKGROUND_WORKERS=0)
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='leo')
+        cls.reader = User.objects.create_user(username='neo')
+        cls.old_post = Post.objects.create(
+            author=cls.author, text='Старый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def timeline_posts(self):
+        return list(TimelineEntry.objects.filter(
+            user=self.reader).values_list('post', flat=True))
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка заполняет ленту постами автора, отписка очищает."""
+        self.authorized_client.post(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertEqual(self.timeline_posts(), [self.old_post.pk])
+        self.authorized_client.post(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.timeline_posts(), [])
+
+    def test_new_post_fans_out(self):
+        """Новый пост раскладывается в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.timeline_posts(), [post.pk, self.old_post.pk])
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [post, self.old_post])
+
+    @override_settings(POSTS_FANOUT_LIMIT=1)
+    def test_popular_author_read_on_request(self):
+        """Посты популярного автора не раскладываются, а читаются из Post."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.timeline_posts(), [])
+        self.assertEqual(timeline.followed_popular(self.reader),
+                         [self.author.pk])
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [post, self.old_post])
+        self.assertEqual(
+            response.context['page_obj'][0].comment_count, 0)
+
+    def test_author_no_longer_popular_is_backfilled(self):
+        """Лента дополняется постами автора, переставшего быть популярным."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with self.settings(POSTS_FANOUT_LIMIT=1):
+            post = Post.objects.create(author=self.author, text='Новый пост')
+        cache.delete(timeline.POPULAR_KEY)
+        self.assertEqual(timeline.followed_popular(self.reader), [])
+        self.assertEqual(self.timeline_posts(), [post.pk, self.old_post.pk])
+
+    @override_settings(POSTS_TIMELINE_BACKFILL=2)
+    def test_backfill_is_capped(self):
+        """При подписке в ленту попадают только последние посты автора."""
+        newer = [
+            Post.objects.create(author=self.author, text=f'Пост {n}')
+            for n in range(3)
+        ]
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.timeline_posts(), [newer[2].pk, newer[1].pk])
+
+    @override_settings(POSTS_FANOUT_LIMIT=2)
+    def test_popular_posts_merged_into_timeline(self):
+        """Посты популярного автора сливаются с лентой, курсор не меняется."""
+        popular = User.objects.create_user(username='morpheus')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=popular)
+        Follow.objects.create(user=self.author, author=popular)
+        cache.delete(timeline.POPULAR_KEY)
+        posts = [self.old_post] + [
+            Post.objects.create(author=author, text='Пост')
+            for author in [self.author, popular] * 6
+        ]
+        posts.reverse()
+        self.assertNotIn(posts[0].pk, self.timeline_posts())
+        url = reverse('posts:follow_index')
+        first = self.authorized_client.get(url, {'cursor': ''})
+        cursor = first.context['page_obj'].next_cursor
+        second = self.authorized_client.get(url, {'cursor': cursor})
+        numbered = self.authorized_client.get(url, {'page': 2})
+        self.assertEqual(list(first.context['page_obj']), posts[:NUMB_POSTS])
+        self.assertEqual(list(second.context['page_obj']), posts[NUMB_POSTS:])
+        self.assertEqual(
+            list(numbered.context['page_obj']), posts[NUMB_POSTS:])
+        with self.settings(POSTS_FANOUT_LIMIT=3):
+            cache.delete(timeline.POPULAR_KEY)
+            response = self.authorized_client.get(url, {'cursor': cursor})
+        self.assertEqual(
+            list(response.context['page_obj']), posts[NUMB_POSTS:])
+
+
+class VoteTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_vote_task(self):
+        """Голос меняет рейтинг на 1, повтор и аноним отклоняются."""
+        like = reverse('posts:like', kwargs={'post_id': self.post.id})
+        dislike = reverse('posts:dislike', kwargs={'post_id': self.post.id})
+        response = self.authorized_client.post(like)
+        self.assertEqual(
+            response.json(), {'new_raiting': 1, 'status': 'OK'})
+        response = self.authorized_client.post(like)
+        self.assertEqual(response.json(), {'status': 'Repeated'})
+        response = self.authorized_client.post(dislike)
+        self.assertEqual(
+            response.json(), {'new_raiting': 0, 'status': 'OK'})
+        self.assertFalse(Vote.objects.exists())
+        response = self.authorized_client.post(dislike)
+        self.assertEqual(
+            response.json(), {'new_raiting': -1, 'status': 'OK'})
+        self.assertEqual(Vote.objects.get().value, Vote.DISLIKE)
+        response = self.guest_client.post(like)
+        self.assertEqual(response.json(), {'status': 'NeOk'})
+        self.assertEqual(Post.objects.get(pk=self.post.pk).raiting, -1)
+
+    def test_vote_missing_post(self):
+        """Голос за несуществующий пост возвращает 404."""
+        response = self.authorized_client.post(
+            reverse('posts:like', kwargs={'post_id': self.post.id + 100}))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Vote.objects.exists())
+
+
+@override_settings(POSTS_VOTE_BUFFER=True, POSTS_VOTE_FLUSH_INTERVAL=60)
+class VoteBufferTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f'user{i}') for i in range(3)
+        ]
+        cls.post = Post.objects.create(
+            author=cls.users[0],
+            text='Тестовый пост',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_vote_buffer(self):
+        """Голоса копятся в буфере и записываются пачкой."""
+        like = reverse('posts:like', kwargs={'post_id': self.post.id})
+        for number, user in enumerate(self.users, start=1):
+            client = Client()
+            client.force_login(user)
+            response = client.post(like)
+            self.assertEqual(response.json()['new_raiting'], number)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).raiting, 0)
+        call_command('flush_votes', stdout=StringIO())
+        self.assertEqual(Post.objects.get(pk=self.post.pk).raiting, 3)
+        self.assertEqual(vote_buffer.delta(self.post.pk), 0)
+
+    @override_settings(POSTS_VOTE_BUFFER_MAX_PENDING=2)
+    def test_vote_buffer_bound(self):
+        """Буфер сбрасывается при превышении лимита голосов."""
+        like = reverse('posts:like', kwargs={'post_id': self.post.id})
+        for user in self.users[:2]:
+            client = Client()
+            client.force_login(user)
+            client.post(like)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).raiting, 2)
+
+
+class LoginDropdownTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo', password='pass')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_context_processor_lazy(self):
+        """Форма входа в шапке не проверяется при отрисовке страниц."""
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(reverse('about:author'))
+        self.assertFalse(response.context['form_aut'].is_bound)
+
+    def test_login_dropdown(self):
+        """Форма входа в шапке отправляется на отдельный адрес."""
+        response = self.guest_client.post(
+            reverse('users:login_dropdown'),
+            {'username': 'neo', 'password': 'pass', 'next': '/best/'})
+        self.assertRedirects(response, '/best/')
+        self.assertEqual(
+            int(self.guest_client.session['_auth_user_id']), self.user.pk)
+        response = self.guest_client.get(reverse('users:login_dropdown'))
+        self.assertEqual(response.status_code, 405)
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_page_cache_task(self):
+        """Анонимные страницы кешируются и сбрасываются новым постом."""
+        templates_pages_names = [
+            reverse('posts:main'),
+            reverse('posts:group_posts', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'neo'}),
+            reverse('posts:best'),
+        ]
+        for reverse_name in templates_pages_names:
+            with self.subTest(reverse_name=reverse_name):
+                response = self.guest_client.get(reverse_name)
+                self.assertEqual(response['X-Page-Cache'], 'MISS')
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(reverse_name)
+                self.assertEqual(response['X-Page-Cache'], 'HIT')
+        Post.objects.create(
+            author=self.user, text='Новый пост', group=self.group)
+        for reverse_name in templates_pages_names:
+            with self.subTest(reverse_name=reverse_name):
+                response = self.guest_client.get(reverse_name)
+                self.assertEqual(response['X-Page-Cache'], 'MISS')
+                self.assertContains(response, 'Новый пост')
+        self.assertEqual(page_cache.stats(), {'hits': 4, 'misses': 8})
+
+    def test_page_cache_csrf(self):
+        """Закешированная страница получает CSRF-токен посетителя."""
+        self.guest_client.get(reverse('posts:main'))
+        client = Client(enforce_csrf_checks=True)
+        response = client.get(reverse('posts:main'))
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertNotContains(response, page_cache.CSRF_PLACEHOLDER)
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+
+    def test_page_cache_other_post_untouched(self):
+        """Новый пост не сбрасывает профиль другого автора."""
+        other = User.objects.create_user(username='leo')
+        profile = reverse('posts:profile', kwargs={'username': 'neo'})
+        self.guest_client.get(profile)
+        Post.objects.create(author=other, text='Чужой пост')
+        response = self.guest_client.get(profile)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+
+    def test_page_cache_moved_post_and_renamed_author(self):
+        """Перенос поста и смена имени автора сбрасывают прежние страницы."""
+        old_group = reverse('posts:group_posts', kwargs={'slug': 'test-slug'})
+        old_profile = reverse('posts:profile', kwargs={'username': 'neo'})
+        self.guest_client.get(old_group)
+        self.guest_client.get(old_profile)
+        post = Post.objects.create(author=self.user, text='Переносимый пост',
+                                   group=self.group)
+        self.guest_client.get(old_group)
+        post.group = Group.objects.create(
+            title='Другая группа', slug='other-slug', description='-')
+        post.save()
+        response = self.guest_client.get(old_group)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertNotContains(response, 'Переносимый пост')
+        self.guest_client.get(old_profile)
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'trinity'
+        user.save()
+        response = self.guest_client.get(old_profile)
+        self.assertEqual(response.status_code, 404)
+
+    def test_login_does_not_look_up_username(self):
+        """Сохранение без username не читает прежнее имя из базы."""
+        user = User.objects.get(pk=self.user.pk)
+        user.last_login = timezone.now()
+        with CaptureQueriesContext(connection) as queries:
+            user.save(update_fields=['last_login'])
+        self.assertFalse(any(
+            query['sql'].startswith('SELECT') for query in queries))
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_post_card_cache(self):
+        """Карточка поста кешируется и меняется вместе с постом."""
+        response = self.authorized_client.get(reverse('posts:main'))
+        version = response.context['page_obj'][0].card_version
+        key = make_template_fragment_key(
+            'post_card', [self.post.pk, version])
+        self.assertIn('Тестовый пост', cache.get(key))
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        response = self.authorized_client.get(reverse('posts:main'))
+        self.assertContains(response, 'Новый текст')
+        self.assertNotEqual(
+            response.context['page_obj'][0].card_version, version)
+
+
+@override_settings(POSTS_BACKGROUND_WORKERS=0)
+class SuggestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='morpheus')
+        cls.group = Group.objects.create(
+            title='Команда Навуходоносора', slug='nebuchadnezzar',
+            description='Тестовое описание')
+        Post.objects.create(
+            author=cls.user, text='Морфеус верит в избранного',
+            group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        suggest.suggestions = suggest.Suggestions()
+
+    def suggest(self, query):
+        response = Client().get(reverse('posts:search_suggest'), {'q': query})
+        return [(item['kind'], item['label'])
+                for item in response.json()['suggestions']]
+
+    def test_prefix_index(self):
+        """Подсказки ищутся по префиксу и сортируются по весу."""
+        index = suggest.PrefixIndex()
+        index.add(suggest.AUTHOR, 1, ['mouse'], 'mouse', '/mouse/', 1)
+        index.add(suggest.AUTHOR, 2, ['morpheus'], 'morpheus', '/m/', 5)
+        index.add(suggest.GROUP, 1, ['matrix', 'mob'], 'Матрица', '/g/', 3)
+        self.assertEqual(
+            [item['label'] for item in index.search(' MO ')],
+            ['morpheus', 'Матрица', 'mouse'])
+        self.assertEqual(len(index.search('mo', limit=2)), 2)
+        self.assertEqual(index.search('x'), [])
+        index.remove(suggest.GROUP, 1)
+        self.assertEqual(index.search('mat'), [])
+
+    def test_suggestions(self):
+        """Подсказки содержат авторов, группы и слова из постов."""
+        self.assertEqual(self.suggest('morph'), [
+            (suggest.AUTHOR, 'morpheus'), (suggest.TERM, 'morpheus')])
+        self.assertEqual(self.suggest('морф'), [(suggest.TERM, 'морфеус')])
+        self.assertIn(
+            (suggest.GROUP, 'Команда Навуходоносора'), self.suggest('наву'))
+        self.assertEqual(self.suggest(''), [])
+
+    def test_suggestions_updated_by_signals(self):
+        """Изменения авторов и групп попадают в готовый индекс."""
+        self.suggest('a')
+        with mock.patch.object(suggest, 'build') as build:
+            user = User.objects.create_user(username='trinity')
+            self.assertEqual(self.suggest('trin'), [
+                (suggest.AUTHOR, 'trinity')])
+            Group.objects.filter(pk=self.group.pk).update(slug='zion')
+            group = Group.objects.get(pk=self.group.pk)
+            group.title = 'Зион'
+            group.save()
+            self.assertNotIn(
+                (suggest.GROUP, 'Команда Навуходоносора'),
+                self.suggest('наву'))
+            self.assertEqual(self.suggest('зи'), [(suggest.GROUP, 'Зион')])
+            User.objects.filter(pk=user.pk).delete()
+            self.assertEqual(self.suggest('trin'), [])
+            build.assert_not_called()
+
+    def test_rebuild_when_events_lost(self):
+        """Если журнал изменений потерян, индекс строится заново."""
+        self.suggest('a')
+        User.objects.create_user(username='tank')
+        cache.delete(suggest.EVENT_KEY.format(cache.get(suggest.SEQ_KEY)))
+        self.assertEqual(self.suggest('tan'), [(suggest.AUTHOR, 'tank')])
+
+    def test_stale_index_served_during_rebuild(self):
+        """Пока индекс перестраивается в фоне, отдается прежний."""
+        self.suggest('a')
+        suggest.suggestions.built -= (
+            settings.POSTS_SUGGEST_REBUILD_INTERVAL + 1)
+        with mock.patch.object(suggest.background, 'submit') as submit:
+            self.assertEqual(self.suggest('morph'), [
+                (suggest.AUTHOR, 'morpheus'), (suggest.TERM, 'morpheus')])
+            self.suggest('morph')
+        submit.assert_called_once_with(suggest.suggestions.rebuild)
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        groups = Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'group-{i}', description='-')
+            for i in range(5))
+        Post.objects.bulk_create(
+            Post(author=cls.admin, text=f'Пост {i}', group=groups[i % 5])
+            for i in range(30))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelist_queries_do_not_depend_on_rows(self):
+        """Список постов в админке не делает запросов на каждую строку."""
+        url = reverse('admin:posts_post_changelist')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        Post.objects.bulk_create(
+            Post(author=self.admin, text='Еще пост') for _ in range(30))
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(large), len(small))
+        self.assertContains(response, 'Группа 4')
+
+    @override_settings(POSTS_ADMIN_COUNT_LIMIT=10)
+    def test_estimated_count(self):
+        """Большие списки считаются оценкой, отфильтрованные — до лимита."""
+        last = Post.objects.order_by('-pk').first()
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertEqual(response.context['cl'].result_count, last.pk)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'несуществующий'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_autocomplete(self):
+        """Автор и группа выбираются через автодополнение."""
+        response = self.client.get(reverse('admin:posts_post_add'))
+        fields = response.context['adminform'].form.fields
+        for name in ('author', 'group'):
+            with self.subTest(field=name):
+                self.assertIsInstance(
+                    fields[name].widget.widget, AutocompleteSelect)
+
+
+@override_settings(POSTS_BULK_JOB_CHUNK=2)
+class BulkJobTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        cls.group = Group.objects.create(
+            title='Зион', slug='zion', description='Тестовое описание')
+        Post.objects.bulk_create(
+            Post(author=cls.admin, text=f'Пост {i}') for i in range(5))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.post_ids = list(
+            Post.objects.order_by('pk').values_list('pk', flat=True))
+
+    def action(self, action, post_ids, **data):
+        return self.client.post(reverse('admin:posts_post_changelist'), {
+            'action': action, '_selected_action': post_ids, **data})
+
+    def test_delete_in_background(self):
+        """Удаление ставится в очередь и выполняется командой."""
+        Comment.objects.create(
+            post_id=self.post_ids[0], author=self.admin, text='Коммент')
+        self.action('delete_in_background', self.post_ids[:3])
+        job = BulkJob.objects.get()
+        self.assertEqual((job.status, job.total), (BulkJob.PENDING, 3))
+        self.assertEqual(Post.objects.count(), 5)
+        call_command('run_bulk_jobs', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), (BulkJob.DONE, 3))
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('pk', flat=True)),
+            self.post_ids[3:])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_move_in_background(self):
+        """Перенос в группу обновляет посты и поисковый индекс."""
+        self.action('move_in_background', self.post_ids,
+                    group=self.group.pk)
+        call_command('run_bulk_jobs', stdout=StringIO())
+        self.assertEqual(self.group.posts.count(), 5)
+        self.assertEqual(
+            fulltext.filter_posts(Post.objects.all(), 'зион').count(), 5)
+
+    def test_move_resets_group_boards(self):
+        """Перенос сбрасывает топы прежней и новой группы."""
+        source = Group.objects.create(
+            title='Матрица', slug='matrix', description='-')
+        Post.objects.filter(pk=self.post_ids[0]).update(group=source)
+        boards = [leaderboards.group_board(group.pk).posts
+                  for group in (source, self.group)]
+        for board in boards:
+            board()
+        self.action('move_in_background', self.post_ids[:1],
+                    group=self.group.pk)
+        call_command('run_bulk_jobs', stdout=StringIO())
+        self.assertEqual(boards[0](), [])
+        self.assertEqual(
+            [post.pk for post in boards[1]()], self.post_ids[:1])
+
+    def test_move_to_deleted_group_fails(self):
+        """Если группу удалили, задание падает, а посты остаются на месте."""
+        group = Group.objects.create(
+            title='Матрица', slug='matrix', description='-')
+        Post.objects.filter(pk=self.post_ids[0]).update(group=self.group)
+        job = bulk_jobs.queue(BulkJob.MOVE, Post.objects.all(), group=group)
+        group.delete()
+        bulk_jobs.run(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BulkJob.FAILED)
+        self.assertEqual(self.group.posts.count(), 1)
+
+    def test_move_without_group_rejected(self):
+        """Перенос без выбранной группы не ставится в очередь."""
+        response = self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {'action': 'move_in_background',
+             '_selected_action': self.post_ids}, follow=True)
+        self.assertContains(response, 'Выберите группу для переноса')
+        self.assertFalse(BulkJob.objects.exists())
+
+    def test_resume_after_crash(self):
+        """Брошенное задание продолжается с первой необработанной пачки."""
+        job = bulk_jobs.queue(BulkJob.DELETE, Post.objects.all())
+        BulkJob.objects.filter(pk=job.pk).update(
+            status=BulkJob.RUNNING, last_post_id=self.post_ids[1],
+            processed=2, heartbeat=timezone.now())
+        self.assertFalse(bulk_jobs.run(job.pk))
+        BulkJob.objects.filter(pk=job.pk).update(
+            heartbeat=timezone.now() - timedelta(hours=1))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(bulk_jobs.run(job.pk))
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('pk', flat=True)),
+            self.post_ids[:2])
+        self.assertFalse(any(
+            str(self.post_ids[0]) in query['sql'] for query in queries
+            if query['sql'].startswith('DELETE')))
+
+    def test_failed_chunk_is_retried(self):
+        """Ошибка останавливает задание после последней целой пачки."""
+        job = bulk_jobs.queue(BulkJob.DELETE, Post.objects.all())
+        delete = bulk_jobs.ACTIONS[BulkJob.DELETE]
+        calls = []
+
+        def flaky(job, post_ids):
+            calls.append(post_ids)
+            if len(calls) == 2:
+                raise RuntimeError('boom')
+            delete(job, post_ids)
+
+        with mock.patch.dict(bulk_jobs.ACTIONS, {BulkJob.DELETE: flaky}):
+            bulk_jobs.run(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), (BulkJob.FAILED, 2))
+        self.assertIn('boom', job.error)
+        self.assertEqual(Post.objects.count(), 3)
+        call_command('run_bulk_jobs', '--retry-failed', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), (BulkJob.DONE, 5))
+        self.assertFalse(Post.objects.exists())
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def add_comments(self, count):
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=User.objects.create_user(
+                username=f'agent-{Comment.objects.count()}-{i}'),
+                text=f'Коммент {i}')
+            for i in range(count))
+
+    def detail(self):
+        return self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+
+    def test_detail_queries_do_not_depend_on_comments(self):
+        """Страница поста не делает запросов на каждый комментарий."""
+        self.add_comments(3)
+        with CaptureQueriesContext(connection) as few:
+            self.detail()
+        self.add_comments(2 * NUMB_COMMENTS)
+        with CaptureQueriesContext(connection) as many:
+            response = self.detail()
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(len(response.context['comments']), NUMB_COMMENTS)
+        self.assertContains(response, 'load-comments')
+
+    def test_load_more(self):
+        """Комментарии подгружаются по курсору до конца без повторов."""
+        self.add_comments(NUMB_COMMENTS * 2 + 5)
+        cursor = self.detail().context['comments'].next_cursor
+        loaded = NUMB_COMMENTS
+        while cursor:
+            response = self.client.get(
+                reverse('posts:post_comments', args=[self.post.pk]),
+                {'cursor': cursor})
+            data = response.json()
+            loaded += data['html'].count('class="comment"')
+            cursor = data['next']
+        self.assertEqual(loaded, Comment.objects.count())
+        self.assertIn(f'Коммент {NUMB_COMMENTS * 2 + 4}', data['html'])
+
+    def test_comments_of_missing_post(self):
+        """Комментарии несуществующего поста отдают 404."""
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='morpheus')
+        cls.reader = User.objects.create_user(username='neo')
+        cls.post = Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def counts(self, user):
+        profile = Profile.objects.get(user=user)
+        return profile.followers_count, profile.following_count
+
+    def test_comment_count(self):
+        """Счетчик комментариев меняется при добавлении и удалении."""
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Коммент'})
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Еще коммент'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        Comment.objects.filter(text='Коммент').delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        response = self.client.get(reverse('posts:main'))
+        self.assertEqual(response.context['page_obj'][0].comment_count, 1)
+
+    def test_follow_counts(self):
+        """Счетчики подписок меняются при подписке, отписке и удалении."""
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        self.assertEqual(self.counts(self.author), (1, 0))
+        self.assertEqual(self.counts(self.reader), (0, 1))
+        response = self.client.get(
+            reverse('posts:profile', args=[self.author.username]))
+        self.assertContains(response, 'Подписчиков: 1')
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username]))
+        self.assertEqual(self.counts(self.author), (0, 0))
+        self.assertEqual(self.counts(self.reader), (0, 0))
+        Follow.objects.create(user=self.reader, author=self.author)
+        User.objects.filter(pk=self.reader.pk).delete()
+        self.assertEqual(self.counts(self.author), (0, 0))
+
+    def test_reconcile_counters(self):
+        """Команда исправляет разошедшиеся счетчики и создает профили."""
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Коммент')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.update(comment_count=7)
+        Profile.objects.filter(user=self.author).update(followers_count=0)
+        Profile.objects.filter(user=self.reader).delete()
+        out = StringIO()
+        call_command('reconcile_counters', '--batch-size', '1', stdout=out)
+        self.assertIn('Fixed 1 posts, 1 profiles, created 1 profiles',
+                      out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.counts(self.author), (1, 0))
+        self.assertEqual(self.counts(self.reader), (0, 1))
+
+
+class RankingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo')
+        now = timezone.now()
+        decay = timedelta(seconds=settings.POSTS_HOT_SCORE_DECAY)
+        with explicit_pub_date():
+            cls.old = Post.objects.create(
+                author=cls.user, text='Старый', raiting=1000,
+                pub_date=now - 4 * decay)
+            cls.popular = Post.objects.create(
+                author=cls.user, text='Популярный', raiting=100,
+                pub_date=now - decay / 2)
+            cls.fresh = Post.objects.create(
+                author=cls.user, text='Свежий', pub_date=now)
+
+    def setUp(self):
+        cache.clear()
+
+    def best(self, **params):
+        response = self.client.get(reverse('posts:best'), params)
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_best_posts_decay(self):
+        """Старые посты уступают свежим, набравшим меньше голосов."""
+        self.assertEqual(
+            self.best(), [self.popular.pk, self.fresh.pk, self.old.pk])
+        cache.clear()
+        self.assertEqual(
+            self.best(cursor=''),
+            [self.popular.pk, self.fresh.pk, self.old.pk])
+
+    def test_new_post_scored_on_insert(self):
+        """Оценка нового поста записывается без отдельного UPDATE."""
+        with CaptureQueriesContext(connection) as queries:
+            post = Post.objects.create(author=self.user, text='Новый')
+        self.assertFalse(any(
+            query['sql'].startswith('UPDATE "posts_post"')
+            for query in queries))
+        post.refresh_from_db()
+        self.assertAlmostEqual(
+            post.hot_score, ranking.hot_score(0, post.pub_date), places=4)
+
+    def test_score_updated_on_vote(self):
+        """Голос сразу пересчитывает оценку поста."""
+        for number in range(2):
+            client = Client()
+            client.force_login(User.objects.create_user(f'agent-{number}'))
+            client.post(reverse('posts:like', args=[self.fresh.pk]))
+        fresh = Post.objects.get(pk=self.fresh.pk)
+        self.assertAlmostEqual(
+            fresh.hot_score, ranking.hot_score(2, fresh.pub_date))
+
+    @override_settings(POSTS_VOTE_BUFFER=True)
+    def test_score_updated_on_flush(self):
+        """Буферизованные голоса пересчитывают оценку при сбросе."""
+        self.client.force_login(self.user)
+        self.client.post(reverse('posts:dislike', args=[self.fresh.pk]))
+        call_command('flush_votes', stdout=StringIO())
+        fresh = Post.objects.get(pk=self.fresh.pk)
+        self.assertAlmostEqual(
+            fresh.hot_score, ranking.hot_score(-1, fresh.pub_date))
+
+    @skipIf(numpy is None, 'numpy is not installed')
+    def test_recompute_hot_scores(self):
+        """Команда пересчитывает оценки всех постов."""
+        Post.objects.update(hot_score=0)
+        out = StringIO()
+        call_command('recompute_hot_scores', '--batch-size', '2', stdout=out)
+        self.assertIn('Updated hot scores of 3 posts', out.getvalue())
+        for post in Post.objects.all():
+            with self.subTest(post=post.text):
+                self.assertAlmostEqual(
+                    post.hot_score,
+                    ranking.hot_score(post.raiting, post.pub_date))
+
+
+@override_settings(POSTS_LEADERBOARD_SIZE=2)
+class LeaderboardTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='neo')
+        cls.group = Group.objects.create(
+            title='Зион', slug='zion', description='Тестовое описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, text=f'Пост {i}', group=cls.group)
+            for i in range(3)
+        ]
+        with explicit_pub_date():
+            cls.old = Post.objects.create(
+                author=cls.user, text='Старый', group=cls.group,
+                pub_date=timezone.now() - timedelta(days=40))
+
+    def setUp(self):
+        cache.clear()
+
+    def like(self, post, count=1):
+        for number in range(count):
+            client = Client()
+            client.force_login(User.objects.create_user(
+                f'agent-{post.pk}-{Vote.objects.count()}'))
+            client.post(reverse('posts:like', args=[post.pk]))
+
+    def best(self, name, *args):
+        response = self.client.get(reverse(name, args=args))
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_place(self):
+        """Топ ограничен по размеру и упорядочен по оценке."""
+        entries = []
+        for post_id, score in [(1, 5), (2, 7), (3, 5), (4, 1), (5, 9)]:
+            entries = leaderboards.place(entries, post_id, score)
+        self.assertEqual(entries, [(-9, -5), (-7, -2), (-5, -3), (-5, -1)])
+        entries = leaderboards.place(entries, 5, 0)
+        self.assertEqual(entries, [(-7, -2), (-5, -3), (-5, -1), (0, -5)])
+
+    def test_votes_update_cached_boards(self):
+        """Голоса переставляют посты в топах без перестройки."""
+        first, second, third = self.posts
+        self.assertEqual(
+            self.best('posts:best_group', self.group.slug),
+            [third.pk, second.pk])
+        self.assertEqual(self.best('posts:best_week'), [third.pk, second.pk])
+        self.assertEqual(
+            self.best('posts:best_month'), [third.pk, second.pk])
+        with mock.patch.object(leaderboards.Board, 'rebuild') as rebuild:
+            self.like(first, 2)
+            self.like(second)
+            self.assertEqual(
+                self.best('posts:best_week'), [first.pk, second.pk])
+            self.assertEqual(
+                self.best('posts:best_month'), [first.pk, second.pk])
+            self.assertEqual(
+                self.best('posts:best_group', self.group.slug)[0], first.pk)
+            rebuild.assert_not_called()
+
+    def test_boards_filter_stale_posts(self):
+        """Старые, удаленные и перенесенные посты не попадают в топы."""
+        Post.objects.filter(pk=self.old.pk).update(raiting=100)
+        self.assertNotIn(self.old.pk, self.best('posts:best_month'))
+        self.best('posts:best_group', self.group.slug)
+        Post.objects.filter(pk=self.posts[2].pk).update(group=None)
+        Post.objects.filter(pk=self.posts[1].pk).delete()
+        self.assertEqual(
+            self.best('posts:best_group', self.group.slug),
+            [self.posts[0].pk])
+
+    def test_moved_post_changes_group_boards(self):
+        """Перенос поста убирает его из топа прежней группы."""
+        other = Group.objects.create(
+            title='Матрица', slug='matrix', description='Тестовое описание')
+        self.best('posts:best_group', self.group.slug)
+        self.best('posts:best_group', other.slug)
+        post = self.posts[2]
+        post.group = other
+        with mock.patch.object(leaderboards.Board, 'rebuild') as rebuild:
+            post.save()
+            self.assertNotIn(
+                post.pk, self.best('posts:best_group', self.group.slug))
+            self.assertEqual(
+                self.best('posts:best_group', other.slug), [post.pk])
+            rebuild.assert_not_called()
+
+    def test_busy_lock_drops_boards(self):
+        """Если топы правит другой запрос, они строятся заново из базы."""
+        first = self.posts[0]
+        self.best('posts:best_week')
+        cache.add(leaderboards.LOCK_KEY, 1)
+        self.like(first, 2)
+        self.assertIsNone(cache.get(leaderboards.period_board(
+            leaderboards.WEEK).key))
+        self.assertEqual(self.best('posts:best_week')[0], first.pk)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedDataTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, **options):
+        defaults = dict(
+            users=20, groups=3, posts=60, comments=40, follows=50,
+            votes=80, images=2, chunk_size=25, workers=1, seed=7)
+        call_command('seed_data', stdout=StringIO(),
+                     **{**defaults, **options})
+
+    def test_seed_data(self):
+        """Команда создает данные и согласованные производные поля."""
+        self.seed()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        self.assertTrue(os.path.exists(
+            os.path.join(TEMP_MEDIA_ROOT, 'posts/seed/1.jpg')))
+        for post in Post.objects.annotate(total=Count('comments')):
+            self.assertEqual(post.comment_count, post.total)
+        for post in Post.objects.annotate(
+                total=Coalesce(Sum('votes__value'), 0)):
+            self.assertEqual(post.raiting, post.total)
+        for profile in Profile.objects.all():
+            self.assertEqual(profile.followers_count,
+                             profile.user.following.count())
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=follow.user, author=follow.author).count(),
+            follow.author.posts.count())
+        post = Post.objects.last()
+        word = max(post.text.split(), key=len).strip('.,')
+        self.assertIn(post, fulltext.filter_posts(Post.objects.all(), word))
+
+    @override_settings(POSTS_TIMELINE_BACKFILL=2)
+    def test_timelines_capped(self):
+        """Ленты получают не больше POSTS_TIMELINE_BACKFILL постов автора."""
+        self.seed(images=0)
+        self.assertTrue(TimelineEntry.objects.exists())
+        popular = timeline.popular_authors()
+        for follow in Follow.objects.exclude(author__in=popular):
+            with self.subTest(follow=follow.pk):
+                self.assertEqual(
+                    TimelineEntry.objects.filter(
+                        user=follow.user, author=follow.author).count(),
+                    min(follow.author.posts.count(), 2))
+
+    def test_seed_is_reproducible(self):
+        """Одинаковый seed дает одинаковые данные при любом числе процессов."""
+        self.seed(skip_derived=True, comments=0)
+        first = list(Post.objects.order_by('pk').values_list(
+            'text', flat=True))
+        Post.objects.all().delete()
+        self.seed(skip_derived=True, comments=0, workers=2)
+        second = list(Post.objects.order_by('pk').values_list(
+            'text', flat=True))
+        self.assertEqual(first, second)
+
+
+class BenchmarkTests(TestCase):
+    def test_benchmark_views(self):
+        """Замеры сохраняются в JSON, ухудшения относительно базы ловятся."""
+        output = os.path.join(tempfile.mkdtemp(), 'benchmark.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        with mock.patch.object(benchmark_views, 'temporary_database',
+                               contextlib.nullcontext):
+            call_command(
+                'benchmark_views', users=10, posts=30, requests=3, warmup=1,
+                memory_requests=1, output=output, stdout=StringIO())
+        with open(output) as file:
+            results = json.load(file)
+        self.assertEqual(set(results['views']), {
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+            'best_posts', 'like', 'dislike', 'add_comment'})
+        for metrics in results['views'].values():
+            self.assertLessEqual(metrics['p50_ms'], metrics['p95_ms'])
+            self.assertGreater(metrics['queries'], 0)
+        baseline = json.loads(json.dumps(results))
+        baseline['views']['index']['queries'] -= 1
+        baseline['views']['profile']['p95_ms'] /= 2
+        self.assertEqual(
+            benchmark_views.regressions(results, baseline, 0.2),
+            [f'index.queries: {results["views"]["index"]["queries"]} > '
+             f'{baseline["views"]["index"]["queries"]}',
+             f'profile.p95_ms: {results["views"]["profile"]["p95_ms"]} > '
+             f'{baseline["views"]["profile"]["p95_ms"]}'])
+        self.assertEqual(
+            benchmark_views.regressions(results, results, 0.2), [])
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import request_started
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS kvstore ('
+    'key TEXT PRIMARY KEY, value TEXT NOT NULL, source TEXT)',
+    'CREATE INDEX IF NOT EXISTS kvstore_source ON kvstore (source)',
+)
+
+MEMO_SIZE = 1000
+
+_local = threading.local()
+
+
+class Memo(OrderedDict):
+    """Прочитанные значения потока, не больше MEMO_SIZE ключей."""
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > MEMO_SIZE:
+            self.popitem(last=False)
+
+
+def memo():
+    if not hasattr(_local, 'memo'):
+        _local.memo = Memo()
+    return _local.memo
+
+
+def clear_memo(**kwargs):
+    memo().clear()
+
+
+request_started.connect(clear_memo)
+
+
+def forget_connections():
+    """Сбрасывает соединения, унаследованные процессом при fork."""
+    _local.__dict__.clear()
+
+
+class KVStore(KVStoreBase):
+    """Метаданные миниатюр в общем для всех процессов файле SQLite."""
+
+    def path(self):
+        return settings.POSTS_THUMBNAIL_KVSTORE_PATH or os.path.join(
+            settings.MEDIA_ROOT, 'cache', 'thumbnails.sqlite3')
+
+    def connection(self):
+        path = self.path()
+        connections = _local.__dict__.setdefault('connections', {})
+        if path not in connections:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            connection = sqlite3.connect(path, timeout=10)
+            connection.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            connection.commit()
+            connections[path] = connection
+        return connections[path]
+
+    def _fetch(self, keys, sources=()):
+        keys, sources = list(keys), list(sources)
+        sql = 'SELECT key, value FROM kvstore WHERE key IN ({})'.format(
+            ', '.join('?' * len(keys)))
+        if sources:
+            sql += ' OR source IN ({})'.format(', '.join('?' * len(sources)))
+        found = dict.fromkeys(keys)
+        found.update(self.connection().execute(sql, keys + sources))
+        memo().update(found)
+        return found
+
+    def prefetch(self, source_keys):
+        """Загружает исходные картинки и все их миниатюры одним запросом."""
+        source_keys = [
+            key for key in set(source_keys)
+            if add_prefix(key) not in memo()
+        ]
+        if source_keys:
+            self._fetch(
+                [add_prefix(key) for key in source_keys], source_keys)
+
+    def set(self, image_file, source=None):
+        super().set(image_file, source)
+        if source is not None:
+            with self.connection() as connection:
+                connection.execute(
+                    'UPDATE kvstore SET source = ? WHERE key = ?',
+                    [source.key, add_prefix(image_file.key)])
+
+    def _get_raw(self, key):
+        if key not in memo():
+            return self._fetch([key])[key]
+        return memo()[key]
+
+    def _set_raw(self, key, value):
+        with self.connection() as connection:
+            connection.execute(
+                'INSERT INTO kvstore (key, value) VALUES (?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value',
+                [key, value])
+        memo()[key] = value
+
+    def _delete_raw(self, *keys):
+        with self.connection() as connection:
+            connection.execute(
+                'DELETE FROM kvstore WHERE key IN ({})'.format(
+                    ', '.join('?' * len(keys))), keys)
+        for key in keys:
+            memo().pop(key, None)
+
+    def _find_keys_raw(self, prefix):
+        escaped = prefix.replace('!', '!!').replace('%', '!%').replace(
+            '_', '!_')
+        return [
+            key for key, in self.connection().execute(
+                "SELECT key FROM kvstore WHERE key LIKE ? ESCAPE '!'",
+                [escaped + '%'])
+        ]
@@ -0,0 +1,57 @@
+import json
+
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post
+
+GEOMETRIES = {
+    'card': '960x600',
+    'detail': '960x339',
+}
+OPTIONS = {'crop': 'center', 'upscale': True}
+WIDTHS = (320, 640, 960, 1920)
+CARD_RATIO = 600 / 960
+
+
+def formats():
+    if features.check('webp'):
+        return ['WEBP', 'JPEG']
+    return ['JPEG']
+
+
+def srcset(image):
+    widths = [width for width in WIDTHS if width <= image.width] or WIDTHS[:1]
+    sets = {}
+    for image_format in formats():
+        sets[image_format.lower()] = ', '.join(
+            '{} {}w'.format(get_thumbnail(
+                image, f'{width}x{round(width * CARD_RATIO)}',
+                format=image_format, **OPTIONS).url, width)
+            for width in widths
+        )
+    return sets
+
+
+def generate(post_id):
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if (post is None or not post.image
+            or not post.image.storage.exists(post.image.name)):
+        return
+    urls = {'source': post.image.name}
+    for name, geometry in GEOMETRIES.items():
+        urls[name] = get_thumbnail(post.image, geometry, **OPTIONS).url
+    urls['srcset'] = srcset(post.image)
+    Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnails=json.dumps(urls))
+
+
+def prefetch(posts):
+    """Загружает метаданные миниатюр sorl для постов без готовых URL."""
+    keys = [
+        ImageFile(post.image).key for post in posts
+        if post.image and not post.thumbnail_urls
+    ]
+    if keys and hasattr(default.kvstore, 'prefetch'):
+        default.kvstore.prefetch(keys)
@@ -0,0 +1,154 @@
+from heapq import merge
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F
+
+from . import background
+from .models import Follow, Post, TimelineEntry
+
+POPULAR_KEY = 'timeline:popular'
+KNOWN_POPULAR_KEY = 'timeline:popular:known'
+BATCH_SIZE = 1000
+ORDERING = ('-pub_date', '-post_id')
+
+
+def popular_authors():
+    authors = cache.get(POPULAR_KEY)
+    if authors is None:
+        authors = set(Follow.objects.values('author').annotate(
+            followers=Count('id')).filter(
+            followers__gte=settings.POSTS_FANOUT_LIMIT).values_list(
+            'author', flat=True))
+        cache.set(POPULAR_KEY, authors, settings.POSTS_POPULAR_TIMEOUT)
+        known = cache.get(KNOWN_POPULAR_KEY) or set()
+        cache.set(KNOWN_POPULAR_KEY, authors, None)
+        for author_id in known - authors:
+            background.submit(backfill_followers, author_id)
+    return authors
+
+
+def followers(author_id):
+    return Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+
+
+def followed_popular(user):
+    authors = popular_authors()
+    if not authors:
+        return []
+    return list(Follow.objects.filter(
+        user=user, author_id__in=authors).values_list('author_id', flat=True))
+
+
+def write(entries):
+    # Django 2.2 не ограничивает явный batch_size лимитами бэкенда.
+    batch_size = min(BATCH_SIZE, max(connection.ops.bulk_batch_size(
+        TimelineEntry._meta.concrete_fields, entries), 1))
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=batch_size, ignore_conflicts=True)
+
+
+def fan_out(post):
+    if post.author_id in popular_authors():
+        return
+    write([
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in followers(post.author_id)
+    ])
+
+
+def recent_posts(author_id):
+    return list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list('pk', 'pub_date')[
+        :settings.POSTS_TIMELINE_BACKFILL])
+
+
+def backfill(user_id, author_id, posts=None):
+    """Копирует в ленту читателя последние посты автора."""
+    if author_id in popular_authors():
+        return
+    if posts is None:
+        posts = recent_posts(author_id)
+    write([
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    ])
+
+
+def backfill_followers(author_id):
+    """Дополняет ленты подписчиков автора, переставшего быть популярным."""
+    if author_id in popular_authors():
+        return
+    posts = recent_posts(author_id)
+    for user_id in followers(author_id).iterator():
+        backfill(user_id, author_id, posts)
+
+
+def prune(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+class Feed:
+    """Лента подписок, слитая из нескольких частей по (pub_date, post_id)."""
+
+    model = TimelineEntry
+    ordered = True
+
+    def __init__(self, parts, descending=True):
+        self.parts = parts
+        self.descending = descending
+
+    def order_by(self, *ordering):
+        return Feed([part.order_by(*ordering) for part in self.parts],
+                    ordering[0].startswith('-'))
+
+    def reverse(self):
+        return Feed([part.reverse() for part in self.parts],
+                    not self.descending)
+
+    def filter(self, *args, **kwargs):
+        return Feed([part.filter(*args, **kwargs) for part in self.parts],
+                    self.descending)
+
+    def count(self):
+        return sum(part.count() for part in self.parts)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('Feed supports only slicing')
+        items = merge(
+            *(list(part[:index.stop]) for part in self.parts),
+            key=lambda item: (item.pub_date, item.post_id),
+            reverse=self.descending,
+        )
+        return list(items)[index]
+
+
+def feed(user):
+    entries = TimelineEntry.objects.filter(user=user).only(
+        'post', 'pub_date').order_by(*ORDERING)
+    authors = followed_popular(user)
+    if not authors:
+        return entries
+    return Feed([
+        entries.exclude(author_id__in=authors),
+        *(Post.objects.for_feed().filter(author_id=author_id).annotate(
+            post_id=F('pk')).order_by(*ORDERING) for author_id in authors),
+    ])
+
+
+def posts(items):
+    """Заменяет записи ленты на посты в том же порядке."""
+    post_ids = [
+        item.post_id for item in items if isinstance(item, TimelineEntry)
+    ]
+    found = Post.objects.for_feed().in_bulk(post_ids) if post_ids else {}
+    posts = [
+        found.get(item.post_id) if isinstance(item, TimelineEntry) else item
+        for item in items
+    ]
+    return [post for post in posts if post is not None]
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.files.uploadhandler import (SkipFile,
+                                             TemporaryFileUploadHandler)
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузки во временный файл и пропускает слишком большие."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POSTS_IMAGE_MAX_BYTES:
+            rejected = getattr(self.request, 'rejected_uploads', set())
+            rejected.add(self.field_name)
+            self.request.rejected_uploads = rejected
+            raise SkipFile
+        return super().receive_data_chunk(raw_data, start)
+
+
+def rejected_uploads(request):
+    """Поля, файлы которых отброшены как слишком большие."""
+    request.FILES
+    return getattr(request, 'rejected_uploads', set())
@@ -27,10 +27,17 @@ urlpatterns = [
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('best/', views.best_posts, name='best'),
+    path('best/week/', views.best_this_week, name='best_week'),
+    path('best/month/', views.best_this_month, name='best_month'),
+    path('best/group/<slug:slug>/', views.best_in_group, name='best_group'),
+    path('search/', views.search, name='search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('like/<int:post_id>', views.like, name='like'),
     path('dislike/<int:post_id>', views.dislike, name='dislike'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     path('follow/', views.follow_index, name='follow_index'),
     path('profile/<str:username>/follow/',
          views.profile_follow,
@@ -40,5 +47,6 @@ urlpatterns = [
          views.profile_unfollow,
          name='profile_unfollow'
          ),
+    path('cache/stats/', views.page_cache_stats, name='page_cache_stats'),
 ]
 
@@ -1,8 +1,157 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
 
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import (EmptyPage, InvalidPage, Page,
+                                   PageNotAnInteger, Paginator)
+from django.db.models import Q
+from django.utils.functional import cached_property
 
-def paginator_func(request, *args):
-    paginator = Paginator(*args)
+from .feed_counts import get_count
+
+
+def paginator_func(request, object_list, per_page, cursor=False,
+                   count_key=None, ordering=('-pub_date', '-id')):
+    if cursor and (settings.POSTS_CURSOR_PAGINATION
+                   or 'cursor' in request.GET):
+        paginator = CursorPaginator(object_list, per_page, ordering)
+        return paginator.get_page(request.GET.get('cursor'))
+    if count_key:
+        paginator = CountedPaginator(object_list, per_page, count_key)
+    else:
+        paginator = Paginator(object_list, per_page)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+class CountedPaginator(Paginator):
+    """Пагинатор с кешированным (или оценочным) числом объектов."""
+
+    def __init__(self, object_list, per_page, count_key):
+        super().__init__(object_list, per_page)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return get_count(self.count_key, self.object_list)
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы не является целым числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page])
+        if not object_list and number > 1:
+            raise EmptyPage('На странице нет результатов')
+        return self._get_page(object_list, number, self)
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            return self.page(1)
+
+
+class CursorPage(Page):
+    is_cursor = True
+
+    def __init__(self, object_list, paginator,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.last_cursor = paginator.encode_cursor(None, reverse=True)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по полям ordering без COUNT(*) и OFFSET."""
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+        super().__init__(object_list.order_by(*ordering), per_page)
+
+    def encode_cursor(self, obj, reverse=False):
+        position = None
+        if obj is not None:
+            position = []
+            for name, _ in self.fields:
+                value = getattr(obj, name)
+                if hasattr(value, 'isoformat'):
+                    value = value.isoformat()
+                position.append(value)
+        raw = json.dumps([position, reverse]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            position, reverse = json.loads(raw.decode())
+            if position is not None:
+                if len(position) != len(self.fields):
+                    raise ValueError
+                model = self.object_list.model
+                position = [
+                    model._meta.get_field(name).to_python(value)
+                    for (name, _), value in zip(self.fields, position)
+                ]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            raise InvalidPage('Некорректный курсор')
+        return position, bool(reverse)
+
+    def keyset_filter(self, position, reverse):
+        condition = None
+        equal = {}
+        for (name, descending), value in zip(self.fields, position):
+            lookup = 'lt' if descending != reverse else 'gt'
+            step = Q(**equal, **{f'{name}__{lookup}': value})
+            condition = step if condition is None else condition | step
+            equal[name] = value
+        return condition
+
+    def page(self, cursor=None):
+        position, reverse = None, False
+        if cursor:
+            position, reverse = self.decode_cursor(cursor)
+        queryset = self.object_list
+        if reverse:
+            queryset = queryset.reverse()
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position, reverse))
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if reverse:
+            items.reverse()
+            has_next, has_previous = position is not None, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        next_cursor = previous_cursor = None
+        if items and has_next:
+            next_cursor = self.encode_cursor(items[-1])
+        if items and has_previous:
+            previous_cursor = self.encode_cursor(items[0], reverse=True)
+        return CursorPage(items, self, next_cursor, previous_cursor)
+
+    def get_page(self, cursor):
+        try:
+            return self.page(cursor)
+        except InvalidPage:
+            return self.page()
@@ -1,61 +1,123 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST
 
-from .models import Post, Group, User, WhoVoted, Follow
-from .utilits import paginator_func
+from . import (feed_counts, fulltext, leaderboards, page_cache, ranking,
+               suggest, thumbnails, timeline, vote_buffer)
+from .models import Comment, Post, Group, User, Vote, Follow
+from .page_cache import cache_anonymous_page
+from .utilits import CursorPaginator, paginator_func
 from .forms import PostForm, CommentForm
+from .uploads import rejected_uploads
 
 
 NUMB_POSTS = 10
+NUMB_COMMENTS = 20
 
 
+@cache_anonymous_page(page_cache.INDEX_SCOPE)
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.all()
-    page_obj = paginator_func(request, post_list, NUMB_POSTS)
+    post_list = Post.objects.for_feed()
+    page_obj = paginator_func(request, post_list, NUMB_POSTS, cursor=True,
+                              count_key=feed_counts.index_key())
+    thumbnails.prefetch(page_obj)
     context = {'page_obj': page_obj}
     return render(request, template, context)
 
 
+@cache_anonymous_page(page_cache.GROUP_SCOPE)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.filter(group=group)
-    page_obj = paginator_func(request, posts, NUMB_POSTS)
+    posts = group.posts.for_feed()
+    page_obj = paginator_func(request, posts, NUMB_POSTS, cursor=True,
+                              count_key=feed_counts.group_key(slug))
+    thumbnails.prefetch(page_obj)
     context = {'group': group, 'page_obj': page_obj}
     return render(request, template, context)
 
 
+@cache_anonymous_page(page_cache.PROFILE_SCOPE)
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=author)
-    page_obj = paginator_func(request, post_list, NUMB_POSTS)
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username)
+    post_list = Post.objects.for_feed().filter(author=author)
+    count_key = feed_counts.author_key(author.pk)
+    page_obj = paginator_func(request, post_list, NUMB_POSTS, cursor=True,
+                              count_key=count_key)
+    posts_count = feed_counts.get_count(count_key, post_list)
+    thumbnails.prefetch(page_obj)
     following = False
     if request.user.is_authenticated and request.user != author:
         following = author.following.filter(user=request.user,
                                             author=author).exists()
 
-    context = {'author': author,
+    context = {'author': author, 'posts_count': posts_count,
                'page_obj': page_obj, 'following': following
                }
     return render(request, template, context)
 
 
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    results = fulltext.SearchResults(query)
+    page_obj = paginator_func(request, results, NUMB_POSTS)
+    thumbnails.prefetch(page_obj)
+    context = {'query': query, 'page_obj': page_obj}
+    return render(request, template, context)
+
+
+def search_suggest(request):
+    query = request.GET.get('q', '')
+    return JsonResponse({'suggestions': suggest.suggestions.search(query)})
+
+
+def comment_page(request, post_id):
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author').only('text', 'created', 'post_id', 'author__username',
+                       'author__first_name', 'author__last_name')
+    paginator = CursorPaginator(
+        comments, NUMB_COMMENTS, ordering=('created', 'id'))
+    return paginator.get_page(request.GET.get('cursor'))
+
+
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
     form = CommentForm(request.POST or None, )
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
-    context = {'post': post, 'form': form, 'comments': comments}
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
+    thumbnails.prefetch([post])
+    context = {
+        'post': post,
+        'form': form,
+        'comments': comment_page(request, post.pk),
+    }
     return render(request, template, context)
 
 
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    comments = comment_page(request, post_id)
+    html = render_to_string(
+        'includes/comments.html', {'comments': comments}, request)
+    return JsonResponse({'html': html, 'next': comments.next_cursor})
+
+
 @login_required
 def post_create(request):
     template = 'posts/create.html'
-    form = PostForm(request.POST, files=request.FILES or None,)
+    form = PostForm(request.POST, files=request.FILES or None,
+                    rejected=rejected_uploads(request))
     if form.is_valid():
         new_post = form.save(commit=False)
         new_post.text = form.cleaned_data['text']
@@ -75,7 +137,8 @@ def post_edit(request, post_id):
         if request.method == "POST":
             form = PostForm(request.POST or None,
                             files=request.FILES or None,
-                            instance=post)
+                            instance=post,
+                            rejected=rejected_uploads(request))
             if form.is_valid():
                 form.text = form.cleaned_data['text']
                 form.group = form.cleaned_data['group']
@@ -103,8 +166,12 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator_func(request, post_list, NUMB_POSTS)
+    post_list = timeline.feed(request.user)
+    count_key = feed_counts.follow_key(request.user.pk)
+    page_obj = paginator_func(request, post_list, NUMB_POSTS, cursor=True,
+                              count_key=count_key, ordering=timeline.ORDERING)
+    page_obj.object_list = timeline.posts(page_obj.object_list)
+    thumbnails.prefetch(page_obj)
     context = {'page_obj': page_obj}
     return render(request, template, context)
 
@@ -113,14 +180,9 @@ def follow_index(request):
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        if not author.following.filter(
-                user=request.user, author=author).exists():
-            follower = Follow()
-            user = get_object_or_404(User, username=request.user)
-            author = get_object_or_404(User, username=username)
-            follower.author = author
-            follower.user = user
-            follower.save()
+        _, created = Follow.objects.get_or_create(
+            user=request.user, author=author)
+        if created:
             return redirect('posts:profile', username)
     return redirect('posts:main')
 
@@ -128,84 +190,89 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    follower = Follow.objects.filter(
-        user=request.user).filter(author=author)
-    if follower:
-        follower.delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username)
 
 
-def like(args, post_id):
-    str = args.POST.get('args')
-    user = args.POST.get('user')
-    user_exists = WhoVoted.objects.filter(
-        post_id=post_id).filter(username=user).exists()
-    raiting = Post.objects.get(pk=post_id).raiting
-    new_raiting = Post.objects.get(pk=post_id)
-    if user != 'AnonymousUser':
-        if not user_exists or WhoVoted.objects.filter(post_id=post_id).filter(
-                username=user).get(username=user).username != user:
-            raiting += 1
-            new_raiting.raiting = raiting
-            new_raiting.save()
-            new_vote = WhoVoted()
-            new_vote.username = user
-            new_vote.post_id = post_id
-            new_vote.type = str
-            new_vote.save()
-            return JsonResponse(data={'new_raiting': Post.objects.get(
-                pk=post_id).raiting, 'status': 'OK'})
-        elif WhoVoted.objects.filter(post_id=post_id).filter(
-                username=user).get(post_id=post_id).type == 'dislike':
-            raiting += 1
-            new_raiting.raiting = raiting
-            new_raiting.save()
-            vote = WhoVoted.objects.filter(username=user).filter(
-                post_id=post_id)
-            vote.delete()
-            return JsonResponse(data={'new_raiting': Post.objects.get(
-                pk=post_id).raiting, 'status': 'OK'})
-        return JsonResponse(data={'status': 'Repeated'})
-    return JsonResponse(data={'status': 'NeOk'})
-
-
-def dislike(args, post_id):
-    str = args.POST.get('args')
-    user = args.POST.get('user')
-    user_exists = WhoVoted.objects.filter(
-        post_id=post_id).filter(username=user).exists()
-    raiting = Post.objects.get(pk=post_id).raiting
-    new_raiting = Post.objects.get(pk=post_id)
-    if user != 'AnonymousUser':
-        if not user_exists or WhoVoted.objects.filter(post_id=post_id).filter(
-                username=user).get(username=user).username != user:
-            raiting -= 1
-            new_raiting.raiting = raiting
-            new_raiting.save()
-            new_user = WhoVoted()
-            new_user.username = user
-            new_user.post_id = post_id
-            new_user.type = str
-            new_user.save()
-            return JsonResponse(data={'new_raiting': Post.objects.get(
-                pk=post_id).raiting, 'status': 'OK'})
-        elif WhoVoted.objects.filter(post_id=post_id).filter(
-                username=user).get(post_id=post_id).type == 'like':
-            raiting -= 1
-            new_raiting.raiting = raiting
-            new_raiting.save()
-            vote = WhoVoted.objects.filter(
-                username=user).filter(post_id=post_id)
-            vote.delete()
-            return JsonResponse(data={'new_raiting': Post.objects.get(
-                pk=post_id).raiting, 'status': 'OK'})
+def vote(request, post_id, value):
+    if not request.user.is_authenticated:
+        return JsonResponse(data={'status': 'NeOk'})
+    buffered = settings.POSTS_VOTE_BUFFER
+    try:
+        with transaction.atomic():
+            if buffered:
+                found = Post.objects.filter(pk=post_id).exists()
+            else:
+                found = Post.objects.filter(pk=post_id).update(
+                    raiting=F('raiting') + value)
+            if not found:
+                raise Http404
+            cancelled, _ = Vote.objects.filter(
+                user=request.user, post_id=post_id, value=-value).delete()
+            if not cancelled:
+                Vote.objects.create(
+                    user=request.user, post_id=post_id, value=value)
+    except IntegrityError:
         return JsonResponse(data={'status': 'Repeated'})
-    return JsonResponse(data={'status': 'NeOk'})
+    if buffered:
+        vote_buffer.add(post_id, value)
+    else:
+        ranking.update([post_id])
+    new_raiting = Post.objects.values_list(
+        'raiting', flat=True).get(pk=post_id)
+    if buffered:
+        new_raiting += vote_buffer.delta(post_id)
+    return JsonResponse(data={'new_raiting': new_raiting, 'status': 'OK'})
+
+
+@require_POST
+def like(request, post_id):
+    return vote(request, post_id, Vote.LIKE)
+
 
+@require_POST
+def dislike(request, post_id):
+    return vote(request, post_id, Vote.DISLIKE)
 
+
+@cache_anonymous_page(page_cache.BEST_SCOPE)
 def best_posts(request):
     template = 'posts/best_posts.html'
-    post_list = Post.objects.all().order_by('-raiting')
-    page_obj = paginator_func(request, post_list, NUMB_POSTS)
+    ordering = ('-hot_score', '-id')
+    post_list = Post.objects.for_feed().order_by(*ordering)
+    page_obj = paginator_func(request, post_list, NUMB_POSTS, cursor=True,
+                              count_key=feed_counts.index_key(),
+                              ordering=ordering)
+    thumbnails.prefetch(page_obj)
     context = {'page_obj': page_obj}
     return render(request, template, context)
+
+
+def leaderboard(request, board, title):
+    template = 'posts/best_posts.html'
+    page_obj = paginator_func(request, board.posts(), NUMB_POSTS)
+    thumbnails.prefetch(page_obj)
+    context = {'page_obj': page_obj, 'title': title}
+    return render(request, template, context)
+
+
+def best_in_group(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return leaderboard(request, leaderboards.group_board(group.pk),
+                       f'Лучшее в группе «{group.title}»')
+
+
+def best_this_week(request):
+    return leaderboard(request, leaderboards.period_board(leaderboards.WEEK),
+                       'Лучшее за неделю')
+
+
+def best_this_month(request):
+    return leaderboard(
+        request, leaderboards.period_board(leaderboards.MONTH),
+        'Лучшее за месяц')
+
+
+@staff_member_required
+def page_cache_stats(request):
+    return JsonResponse(data=page_cache.stats())
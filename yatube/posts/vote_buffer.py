@@ -0,0 +1,85 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, IntegerField, When
+
+from . import ranking
+from .models import Post
+
+DELTA_KEY = 'vote_buffer:delta:{}'
+DIRTY_KEY = 'vote_buffer:dirty:{}'
+SLOT_KEY = 'vote_buffer:slot:{}'
+SEQ_KEY = 'vote_buffer:seq'
+FLUSHED_KEY = 'vote_buffer:flushed'
+PENDING_KEY = 'vote_buffer:pending'
+STARTED_KEY = 'vote_buffer:started'
+LOCK_KEY = 'vote_buffer:lock'
+BATCH_SIZE = 500
+
+
+def incr(key, delta):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        return cache.incr(key, delta)
+
+
+def delta(post_id):
+    return cache.get(DELTA_KEY.format(post_id)) or 0
+
+
+def add(post_id, value):
+    incr(DELTA_KEY.format(post_id), value)
+    dirty_timeout = settings.POSTS_VOTE_FLUSH_INTERVAL * 2
+    if cache.add(DIRTY_KEY.format(post_id), 1, dirty_timeout):
+        cache.set(SLOT_KEY.format(incr(SEQ_KEY, 1)), post_id, None)
+    pending = incr(PENDING_KEY, 1)
+    cache.add(STARTED_KEY, time.time(), None)
+    started = cache.get(STARTED_KEY) or time.time()
+    if (pending >= settings.POSTS_VOTE_BUFFER_MAX_PENDING
+            or time.time() - started >= settings.POSTS_VOTE_FLUSH_INTERVAL):
+        flush()
+
+
+def apply(deltas):
+    Post.objects.filter(pk__in=deltas).update(raiting=Case(
+        *[When(pk=pk, then=F('raiting') + value)
+          for pk, value in deltas.items()],
+        output_field=IntegerField(),
+    ))
+    ranking.update(list(deltas))
+
+
+def flush(batch_size=BATCH_SIZE):
+    if not cache.add(LOCK_KEY, 1, 60):
+        return 0
+    try:
+        cache.delete_many([STARTED_KEY, PENDING_KEY])
+        first = cache.get(FLUSHED_KEY) or 0
+        last = cache.get(SEQ_KEY) or 0
+        flushed = 0
+        for start in range(first + 1, last + 1, batch_size):
+            slots = [
+                SLOT_KEY.format(n)
+                for n in range(start, min(start + batch_size, last + 1))
+            ]
+            post_ids = set(cache.get_many(slots).values())
+            cache.delete_many(
+                [DIRTY_KEY.format(post_id) for post_id in post_ids])
+            deltas = {}
+            for post_id in post_ids:
+                value = delta(post_id)
+                if value:
+                    deltas[post_id] = value
+            if deltas:
+                apply(deltas)
+            for post_id, value in deltas.items():
+                incr(DELTA_KEY.format(post_id), -value)
+            cache.delete_many(slots)
+            cache.set(FLUSHED_KEY, start + len(slots) - 1, None)
+            flushed += len(deltas)
+        return flushed
+    finally:
+        cache.delete(LOCK_KEY)
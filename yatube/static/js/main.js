@@ -18,5 +18,41 @@ $('body').on('submit', '.test', function (e){
         }
     })
 })
+var suggestTimer;
+$('body').on('input', '.search-txt', function (){
+    var input=this;
+    clearTimeout(suggestTimer);
+    suggestTimer=setTimeout(function (){
+        var list=$('#search-suggestions');
+        $.getJSON($(input).data('suggest-url'), {q: input.value}, function (response){
+            list.empty();
+            $.each(response['suggestions'], function (i, item){
+                list.append($('<option>').attr('value', item['label']));
+            })
+        })
+    }, 250)
+})
+function loadComments(button){
+    if (button.data('loading')) {return}
+    button.data('loading', true)
+    $.getJSON(button.data('url'), {cursor: button.data('cursor')}, function (response){
+        $('.comments').append(response['html']);
+        if (response['next']) {
+            button.data('cursor', response['next']).data('loading', false)
+        } else {
+            button.remove()
+        }
+    })
+}
+$('body').on('click', '.load-comments', function (){
+    loadComments($(this))
+})
+if ('IntersectionObserver' in window) {
+    var observer=new IntersectionObserver(function (entries){
+        $.each(entries, function (i, entry){
+            if (entry.isIntersecting) {loadComments($(entry.target))}
+        })
+    });
+    $('.load-comments').each(function (){observer.observe(this)})
+}
 })
-
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_profiles(apps, schema_editor):
+    Profile = apps.get_model('users', 'Profile')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Profile.objects.bulk_create(
+        Profile(user_id=user_id)
+        for user_id in User.objects.values_list('pk', flat=True).iterator())
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(create_profiles, migrations.RunPython.noop),
+    ]
@@ -37,6 +37,11 @@ urlpatterns = [
         LoginView.as_view(template_name='users/login.html'),
         name='login'
     ),
+    path(
+        'login/dropdown/',
+        views.DropdownLogin.as_view(),
+        name='login_dropdown'
+    ),
     path(
         'password_change/',
         PasswordChangeView.as_view(
@@ -1,3 +1,4 @@
+from django.contrib.auth.views import LoginView
 from django.views.generic import CreateView
 from django.urls import reverse_lazy
 from .forms import CreationForm
@@ -7,3 +8,8 @@ class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy('posts:main')
     template_name = 'users/signup.html'
+
+
+class DropdownLogin(LoginView):
+    http_method_names = ['post']
+    template_name = 'users/login.html'
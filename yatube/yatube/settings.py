@@ -164,3 +164,87 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+
+# Ленты постов листаются курсором (?cursor=) вместо номера страницы:
+# без COUNT(*) и OFFSET, время не растет с глубиной.
+POSTS_CURSOR_PAGINATION = False
+
+# Число постов в лентах для пагинатора берется из кеша и обновляется
+# сигналами; на PostgreSQL можно использовать оценку планировщика.
+POSTS_COUNT_CACHE_TIMEOUT = 60 * 5
+POSTS_COUNT_ESTIMATE = False
+
+# Буфер голосов: изменения рейтинга копятся в кеше и записываются в Post
+# пачками (при голосовании раз в POSTS_VOTE_FLUSH_INTERVAL секунд или после
+# POSTS_VOTE_BUFFER_MAX_PENDING голосов, а также командой flush_votes).
+# При потере кеша теряется не больше этого объема. Включать вместе с общим
+# для всех процессов кешем (Redis, Memcached).
+POSTS_VOTE_BUFFER = False
+POSTS_VOTE_FLUSH_INTERVAL = 5
+POSTS_VOTE_BUFFER_MAX_PENDING = 1000
+
+# Кеш страниц лент для анонимных посетителей; сбрасывается сигналами
+# при изменении постов, групп и комментариев.
+POSTS_PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Лента подписок хранится в TimelineEntry: новый пост раскладывается
+# подписчикам при публикации. Посты авторов, у которых подписчиков не меньше
+# POSTS_FANOUT_LIMIT, не раскладываются, а читаются из Post при запросе.
+# При подписке в ленту копируются POSTS_TIMELINE_BACKFILL последних постов
+# автора; список популярных авторов пересчитывается раз в
+# POSTS_POPULAR_TIMEOUT секунд.
+POSTS_FANOUT_LIMIT = 1000
+POSTS_TIMELINE_BACKFILL = 200
+POSTS_POPULAR_TIMEOUT = 60 * 15
+
+# Пул потоков для фоновых задач (миниатюры картинок постов); задачи
+# запускаются после коммита транзакции. 0 — выполнять сразу в запросе.
+POSTS_BACKGROUND_WORKERS = 2
+
+# Метаданные миниатюр sorl хранятся в общем файле SQLite: холодный процесс
+# получает миниатюры всей страницы одним запросом (posts.thumbnails.prefetch).
+THUMBNAIL_KVSTORE = 'posts.thumbnail_kvstore.KVStore'
+# По умолчанию файл лежит в MEDIA_ROOT/cache рядом с самими миниатюрами.
+POSTS_THUMBNAIL_KVSTORE_PATH = os.getenv('THUMBNAIL_KVSTORE_PATH')
+
+# Загрузки всегда пишутся во временный файл по частям, файл больше
+# POSTS_IMAGE_MAX_BYTES отбрасывается с ошибкой формы; картинки постов
+# ограничены по размеру файла и числу пикселей, крупные уменьшаются до
+# POSTS_IMAGE_MAX_SIDE по большей стороне, EXIF удаляется.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.BoundedUploadHandler']
+POSTS_IMAGE_MAX_BYTES = 10 * 2 ** 20
+POSTS_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+POSTS_IMAGE_MAX_SIDE = 2560
+
+# Полнотекстовый поиск по постам: FTS5 на SQLite, tsvector с GIN-индексом
+# на PostgreSQL (с этой конфигурацией словаря).
+POSTS_SEARCH_CONFIG = 'russian'
+
+# Подсказки поиска строятся в памяти процесса из авторов, групп и
+# POSTS_SUGGEST_TERMS самых частых слов индекса; целиком индекс
+# перестраивается раз в POSTS_SUGGEST_REBUILD_INTERVAL секунд.
+POSTS_SUGGEST_TERMS = 5000
+POSTS_SUGGEST_REBUILD_INTERVAL = 60 * 60
+
+# Сколько постов админка считает точно; для больших таблиц число строк
+# берется из статистики базы.
+POSTS_ADMIN_COUNT_LIMIT = 10000
+
+# Массовые действия админки выполняются фоновыми заданиями пачками по
+# POSTS_BULK_JOB_CHUNK постов; задание без отметок дольше
+# POSTS_BULK_JOB_LEASE секунд подхватывается заново (run_bulk_jobs).
+POSTS_BULK_JOB_CHUNK = 500
+POSTS_BULK_JOB_LEASE = 5 * 60
+
+# Время в секундах, за которое новизна поста дает в рейтинге «лучших»
+# столько же, сколько десятикратный рост числа голосов.
+POSTS_HOT_SCORE_DECAY = 45000
+
+# Топы «лучших» по группам и за неделю/месяц: сколько постов показывать
+# и сколько секунд топ живет в кеше до перестройки запросом к базе.
+# Голоса правят топы в кеше на месте; с LocMemCache у каждого процесса
+# свой топ, поэтому время жизни короткое. Увеличивать его стоит только
+# с общим кешем (Redis, Memcached).
+POSTS_LEADERBOARD_SIZE = 50
+POSTS_LEADERBOARD_TIMEOUT = 60